@@ -29,6 +29,11 @@ class CircularCA(CA):
         self.array = numpy.zeros((self.n, self.m), dtype=numpy.int8)
         self.next = 0
 
+        # map from neighborhood code 4*a + 2*b + c to the next state
+        triples = [((x>>2)&1, (x>>1)&1, x&1) for x in range(8)]
+        self.lookup = numpy.array([self.table[t] for t in triples],
+                                  dtype=numpy.int8)
+
     def start_single(self):
         """start with one cell in the left of the top row"""
         self.array[0, 1] = 1
@@ -40,14 +45,15 @@ class CircularCA(CA):
         self.next += 1
 
         a = self.array
-        t = self.table
 
         # copy the ghost cells
         a[i-1,0] = a[i-1,self.m-2]
         a[i-1,self.m-1] = a[i-1,1]
 
-        for j in xrange(1,self.m-1):
-            a[i,j] = t[tuple(a[i-1, j-1:j+2])]
+        # compute the neighborhood codes for all cells at once
+        prev = a[i-1]
+        c = 4*prev[:-2] + 2*prev[1:-1] + prev[2:]
+        a[i,1:-1] = self.lookup[c]
 
     def get_array(self, start=0, end=None):
         """get a slice of columns from the CA, with slice indices
@@ -43,7 +43,88 @@ def vfunc(con, rand, p=0.05, f=0.005):
     else:
         return 1
 
-update_func = numpy.vectorize(vfunc, [numpy.int8])
+
+class RuleTable(object):
+    """Lookup tables for a rule of the form func(con, rand).
+
+    The rule is evaluated once for each possible value of con, and
+    the dependence on rand is reduced to a threshold: the result is
+    table[con] if rand < thresholds[con], and table[con + num_codes]
+    otherwise.  Then an update is two gathers and a comparison, with
+    no calls to Python for each cell.
+    """
+
+    def __init__(self, func, num_codes, dtype=numpy.int8):
+        """Compiles the rule.
+
+        func: function that takes a code and a random number in [0, 1)
+              and returns the new state
+        num_codes: number of possible codes, 0 through num_codes-1
+        dtype: type of the states
+
+        Raises ValueError if the result for some code depends on rand
+        in a way that is not a single threshold.
+        """
+        self.num_codes = num_codes
+        self.thresholds = numpy.zeros(num_codes)
+        self.table = numpy.zeros(2 * num_codes, dtype=dtype)
+
+        top = numpy.nextafter(1.0, 0.0)
+        probes = numpy.linspace(0, top, 101)
+        for code in range(num_codes):
+            low, high = func(code, 0.0), func(code, top)
+            threshold = 0.0
+            if low != high:
+                threshold = find_threshold(func, code, low, top)
+            for r in probes:
+                expected = low if r < threshold else high
+                if func(code, r) != expected:
+                    raise ValueError('Rule for code %d is not a single '
+                                     'threshold in rand' % code)
+            self.thresholds[code] = threshold
+            self.table[code] = low
+            self.table[code + num_codes] = high
+
+    def apply(self, con, rand, out, buffers=None):
+        """Applies the rule to arrays of codes and random numbers.
+
+        con: array of codes
+        rand: array of random numbers in [0, 1)
+        out: array for the results
+        buffers: arrays returned by make_buffers, to avoid allocating
+        """
+        if buffers is None:
+            buffers = self.make_buffers(con.shape)
+        thresh, high, index = buffers
+        self.thresholds.take(con, out=thresh)
+        numpy.greater_equal(rand, thresh, out=high)
+        numpy.multiply(high, self.num_codes, out=index)
+        index += con
+        self.table.take(index, out=out)
+
+    def make_buffers(self, shape):
+        """Makes the temporary arrays used by apply."""
+        return (numpy.empty(shape),
+                numpy.empty(shape, dtype=bool),
+                numpy.empty(shape, dtype=numpy.intp))
+
+
+def find_threshold(func, code, low, top):
+    """Finds the smallest rand where func(code, rand) stops being low.
+
+    Uses bisection, so it assumes there is only one such point.
+
+    returns: float
+    """
+    lo, hi = 0.0, top
+    while True:
+        mid = (lo + hi) / 2
+        if mid <= lo or mid >= hi:
+            return hi
+        if func(code, mid) == low:
+            lo = mid
+        else:
+            hi = mid
 
 
 class Forest(object):
@@ -66,6 +147,17 @@ class Forest(object):
                                     [1,100,1],
                                     [1,1,1]])
 
+        # states are at most 10, which bounds the codes
+        num_codes = self.weights.sum() * 10 + 1
+        self.rule = RuleTable(vfunc, num_codes)
+
+        # reused for each step; the generator is seeded from the
+        # global one, so numpy.random.seed still works
+        self.rng = numpy.random.default_rng(numpy.random.randint(2**31))
+        self.con = numpy.empty((n, n), numpy.int16)
+        self.rand = numpy.empty((n, n))
+        self.buffers = self.rule.make_buffers((n, n))
+
     def get_array(self, start=0, end=None):
         """Gets a slice of columns from the CA, with slice indices
         (start, end).  Avoid copying if possible.
@@ -77,23 +169,27 @@ class Forest(object):
 
     def loop(self, steps=1):
         """Executes the given number of time steps."""
-        [self.step() for i in xrange(steps)]
+        [self.step() for i in range(steps)]
 
     def step(self):
         """Executes one time step."""
-        con = scipy.ndimage.filters.convolve(self.array, 
-                                             self.weights,
-                                             mode=self.mode)
-        rand = numpy.random.rand(self.n, self.n)
-        self.array = update_func(con, rand)
+        scipy.ndimage.convolve(self.array, self.weights,
+                               output=self.con, mode=self.mode)
+        self.rng.random(out=self.rand)
+        self.rule.apply(self.con, self.rand, self.array, self.buffers)
 
     def count(self):
-        data = []
-        a = numpy.int8(self.array == 1)
-        for i in range(self.n):
-            total = numpy.sum(a[:i, :i])
-            data.append((i+1, total))
-        return zip(*data)
+        """Counts the trees in the top left i by i box, for each i.
+
+        Uses a table of cumulative sums, so each box takes constant
+        time.
+        """
+        a = numpy.int64(self.array == 1)
+        table = numpy.zeros((self.n+1, self.n+1), numpy.int64)
+        table[1:, 1:] = a.cumsum(axis=0).cumsum(axis=1)
+        i = numpy.arange(self.n)
+        totals = table[i, i]
+        return i+1, totals
 
 
 class ForestViewer(object):
@@ -147,7 +243,7 @@ def main(script, n=50, steps=50, *args):
         xs, ys = forest.count()
 
         slope, inter = fractal.fit_loglog(xs, ys, n/4)
-        print i+1, slope
+        print(i+1, slope)
 
     fractal.plot_loglog(xs, ys)    
 
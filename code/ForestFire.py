@@ -1,7 +1,7 @@
 from pylab import *
 from CellWorld import *
 from cmath import *
-from Fourier import fft
+from Fourier import Welch
 from Dist import *        
 
 class Forest(CellWorld):
@@ -13,7 +13,7 @@ class Forest(CellWorld):
         CellWorld.__init__(self, size, csize)
         self.p = p              # probability of a new tree
         self.f = f              # probability of a spontaneous fire
-        self.series = []
+        self.spectrum = Welch(window=256)
         
     def setup(self):
         # the left frame contains the canvas
@@ -163,28 +163,22 @@ class Forest(CellWorld):
             if patch.state == 'orange':
                 burning += 1
 
-        self.series.append(burning)
+        self.spectrum.add(burning)
         self.display_fft(256)
 
     def display_fft(self, N=4096):
-        """display the FFT of the last (N) values in self.series
+        """display the power spectral density of the series of
+        burning counts, every (N) steps.  The estimate is the average
+        periodogram of all windows so far (Welch's method).
         """
-        if len(self.series) % N != 0:
+        if self.spectrum.count % N != 0 or not self.spectrum.segments:
             return
 
-        h = self.series[-N:]
-        H = fft(h)
-
-        # the squared magnitude of the fft is an estimate of the
-        # power spectral density
-
-        # http://documents.wolfram.com/applications/timeseries/
-        #      UsersGuidetoTimeSeries/1.8.3.html
+        # http://en.wikipedia.org/wiki/Welch%27s_method
         # http://en.wikipedia.org/wiki/Power_spectral_density
-        freq = range(N/2 + 1)
-        sdf = [Hn * Hn.conjugate() for Hn in H]
-        sdf = [sdf[f].real for f in freq]
-        loglog(freq, sdf)
+        freq, sdf = self.spectrum.get_psd()
+        loglog(freq[1:], sdf[1:])
+        title('slope %.2f' % self.spectrum.get_slope())
         xlabel('frequency')
         ylabel('power')
         show()
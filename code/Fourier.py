@@ -11,6 +11,8 @@ Distributed under the GNU General Public License at gnu.org/licenses/gpl.html.
 # complex numbers
 from cmath import *
 
+import timeit
+
 import numpy
 import matplotlib.pyplot as pyplot
 
@@ -18,6 +20,10 @@ import matplotlib.pyplot as pyplot
 def fft(h):
     """Computes the discrete Fourier transform of the sequence h.
     Assumes that len(h) is a power of two.
+
+    This is the recursive version, kept as a reference; note that it
+    uses exp(+2 pi i / N), the opposite sign from numpy.fft.fft.
+    See fft_batch for a faster version.
     """
     N = len(h)
  
@@ -35,12 +41,279 @@ def fft(h):
     H = [e + w*o for w, e, o in zip(ws, He+He, Ho+Ho)]
     return H
 
+# caches of arrays that depend only on the size of the transform
+_twiddles = {}
+_reversals = {}
+_chirps = {}
+_kernels = {}
+
+
+def get_twiddles(N):
+    """Returns the twiddle factors exp(-2 pi i k / N) for k < N/2."""
+    if N not in _twiddles:
+        k = numpy.arange(N // 2)
+        _twiddles[N] = numpy.exp(-2j * numpy.pi * k / N)
+    return _twiddles[N]
+
+
+def get_reversal(N):
+    """Returns the bit-reversal permutation of range(N).
+
+    N must be a power of two.
+    """
+    if N not in _reversals:
+        rev = numpy.zeros(1, dtype=int)
+        while len(rev) < N:
+            rev = numpy.concatenate([2*rev, 2*rev+1])
+        _reversals[N] = rev
+    return _reversals[N]
+
+
+def get_chirp(N):
+    """Returns the chirp exp(-pi i n**2 / N) for n < N.
+
+    n**2 is reduced mod 2N first, which keeps the angles small.
+    """
+    if N not in _chirps:
+        n = numpy.arange(N)
+        _chirps[N] = numpy.exp(-1j * numpy.pi * (n*n % (2*N)) / N)
+    return _chirps[N]
+
+
+def get_kernel(N):
+    """Returns the FFT of the chirp filter used by fft_bluestein.
+
+    returns: tuple of (M, B), where M is the length of the padded
+             convolution, a power of two at least 2N-1
+    """
+    if N not in _kernels:
+        M = 1
+        while M < 2*N - 1:
+            M *= 2
+        chirp = get_chirp(N)
+        b = numpy.zeros(M, dtype=complex)
+        b[:N] = chirp.conjugate()
+        b[M-N+1:] = chirp[1:][::-1].conjugate()
+        _kernels[N] = M, fft_radix2(b)
+    return _kernels[N]
+
+
+def fft_radix2(h):
+    """Computes the DFT along the last axis, iteratively.
+
+    Uses the same sign convention as numpy.fft.fft.  The values are
+    put in bit-reversed order, then each stage does all of the
+    butterflies of one size with array operations.  This is an
+    iterative version of fft_rec in soln/fft_soln.ipynb.
+
+    h: array with shape (..., N), where N is a power of two
+
+    returns: complex array with the same shape
+    """
+    h = numpy.asarray(h)
+    N = h.shape[-1]
+    if N & (N-1):
+        raise ValueError('Length must be a power of two: %d' % N)
+
+    x = h[..., get_reversal(N)].astype(complex)
+    size = 2
+    while size <= N:
+        half = size // 2
+        x = x.reshape(h.shape[:-1] + (N // size, size))
+        e = x[..., :half]
+        o = x[..., half:] * get_twiddles(size)
+        x = numpy.concatenate([e + o, e - o], axis=-1)
+        size *= 2
+    return x.reshape(h.shape)
+
+
+def ifft_radix2(H):
+    """Computes the inverse DFT along the last axis.
+
+    H: array with shape (..., N), where N is a power of two
+    """
+    H = numpy.asarray(H)
+    return fft_radix2(H.conjugate()).conjugate() / H.shape[-1]
+
+
+def fft_bluestein(h):
+    """Computes the DFT along the last axis, for any length.
+
+    Uses Bluestein's algorithm, which writes the DFT as a convolution
+    with a chirp; the convolution is computed with radix-2 FFTs of a
+    power of two at least 2N-1.
+
+    h: array with shape (..., N)
+
+    returns: complex array with the same shape
+    """
+    h = numpy.asarray(h)
+    N = h.shape[-1]
+    M, B = get_kernel(N)
+
+    chirp = get_chirp(N)
+    a = numpy.zeros(h.shape[:-1] + (M,), dtype=complex)
+    a[..., :N] = h * chirp
+
+    conv = ifft_radix2(fft_radix2(a) * B)
+    return conv[..., :N] * chirp
+
+
+def fft_batch(h):
+    """Computes the DFT along the last axis of an array.
+
+    Each row is one signal, so many signals can be transformed at
+    once.  Powers of two use fft_radix2; other lengths use
+    fft_bluestein.  The result should agree with numpy.fft.fft.
+
+    h: array with shape (..., N)
+
+    returns: complex array with the same shape
+    """
+    h = numpy.asarray(h)
+    N = h.shape[-1]
+    if N == 0:
+        return h.astype(complex)
+    if N & (N-1) == 0:
+        return fft_radix2(h)
+    return fft_bluestein(h)
+
+
+def benchmark(sizes=[64, 100, 256, 1000, 1024, 4096], batch=16, number=5):
+    """Compares the running times of the FFT implementations.
+
+    Prints the average time in milliseconds for one call with a single
+    signal, and for one call with a batch of signals; fft is only run
+    for powers of two.
+
+    sizes: sequence of lengths
+    batch: number of signals in a batch
+    number: number of calls to time
+    """
+    variants = [('fft', lambda h: [fft(list(row)) for row in h]),
+                ('fft_batch', fft_batch),
+                ('numpy', numpy.fft.fft)]
+
+    print('%6s %10s %12s %12s' % ('N', 'variant', 'single', 'batch'))
+    for N in sizes:
+        signals = numpy.random.random((batch, N))
+        for name, func in variants:
+            if name == 'fft' and N & (N-1):
+                continue
+            single = timeit.timeit(lambda: func(signals[:1]), number=number)
+            many = timeit.timeit(lambda: func(signals), number=number)
+            print('%6d %10s %12.3f %12.3f' % (N, name,
+                                             1000 * single / number,
+                                             1000 * many / number))
+
+
 def psd(H, N):
     p = [Hn * Hn.conjugate() for Hn in H]
     freqs = range(N/2 + 1)
     p = [p[f].real for f in freqs]
     return freqs, p
 
+class Welch(object):
+    """Estimates the power spectral density of a stream of values.
+
+    Uses Welch's method: the stream is divided into overlapping
+    windows, each window is tapered and transformed, and the
+    periodograms are averaged.  The last window of values is kept
+    in a ring buffer, so memory does not grow with the length of
+    the stream, and the estimate is available at any time.
+    """
+
+    def __init__(self, window=256, overlap=None, rate=1.0):
+        """Initializes the attributes.
+
+        window: number of values in each window
+        overlap: number of values shared by consecutive windows,
+                 defaults to half a window
+        rate: sampling rate, used to compute frequencies
+        """
+        if overlap is None:
+            overlap = window // 2
+        if not 0 <= overlap < window:
+            raise ValueError('overlap must be at least 0 and less '
+                             'than window')
+
+        self.window = window
+        self.hop = window - overlap
+        self.rate = rate
+
+        self.buffer = numpy.zeros(window)
+        self.count = 0          # number of values added
+        self.segments = 0       # number of windows averaged
+        self.total = numpy.zeros(window // 2 + 1)
+
+        # periodic Hann taper, scaled so the result is a density
+        n = numpy.arange(window)
+        self.taper = 0.5 - 0.5 * numpy.cos(2 * numpy.pi * n / window)
+        self.scale = 1.0 / (rate * numpy.sum(self.taper**2))
+
+    def add(self, value):
+        """Adds a value to the stream."""
+        self.buffer[self.count % self.window] = value
+        self.count += 1
+        if self.count >= self.window and \
+                (self.count - self.window) % self.hop == 0:
+            self.add_segment()
+
+    def extend(self, values):
+        """Adds a sequence of values to the stream."""
+        for value in values:
+            self.add(value)
+
+    def add_segment(self):
+        """Adds the periodogram of the current window to the total."""
+        # unroll the ring buffer so the oldest value comes first
+        start = self.count % self.window
+        h = numpy.concatenate([self.buffer[start:], self.buffer[:start]])
+        h -= h.mean()
+
+        H = numpy.fft.rfft(h * self.taper)
+        p = (H * H.conjugate()).real * self.scale
+
+        # fold the negative frequencies into the positive ones
+        if self.window % 2:
+            p[1:] *= 2
+        else:
+            p[1:-1] *= 2
+
+        self.total += p
+        self.segments += 1
+
+    def get_psd(self):
+        """Gets the current estimate of the power spectral density.
+
+        returns: tuple of (freqs, psd) arrays; psd is all zeros until
+                 the first window is full
+        """
+        freqs = numpy.fft.rfftfreq(self.window, 1.0 / self.rate)
+        psd = self.total / max(self.segments, 1)
+        return freqs, psd
+
+    def get_slope(self, low=None, high=None):
+        """Fits a line to the PSD on a log-log scale.
+
+        low, high: range of frequencies to fit, inclusive; defaults to
+                   all frequencies except 0
+
+        returns: slope, or nan if there are fewer than two points
+        """
+        freqs, psd = self.get_psd()
+        legit = (freqs > 0) & (psd > 0)
+        if low is not None:
+            legit &= freqs >= low
+        if high is not None:
+            legit &= freqs <= high
+        if numpy.sum(legit) < 2:
+            return numpy.nan
+        slope, inter = numpy.polyfit(numpy.log(freqs[legit]),
+                                     numpy.log(psd[legit]), 1)
+        return slope
+
+
 def main(script, use_numpy=False):
     # make a signal with two sine components, f=6 and f=12
     N = 128
@@ -68,5 +341,8 @@ def main(script, use_numpy=False):
 
 if __name__ == '__main__':
     import sys
-    main(*sys.argv)
+    if sys.argv[1:] == ['benchmark']:
+        benchmark()
+    else:
+        main(*sys.argv)
 
@@ -1,10 +1,11 @@
 import itertools
+import math
 
 import numpy as np
 import matplotlib.pyplot as plt
 
 from Cell2D import Cell2D, Cell2DViewer
-from scipy.signal import correlate2d
+from scipy.fft import dstn
 
 
 class SandPile(Cell2D):
@@ -14,41 +15,65 @@ class SandPile(Cell2D):
                        [1,-4, 1],
                        [0, 1, 0]], dtype=np.int32)
 
-    def __init__(self, n, m=None, level=9):
+    # value of the cells around the edge in `relax`
+    sink = -2**30
+
+    def __init__(self, n, m=None, level=9, batch=None):
         """Initializes the attributes.
 
         n: number of rows
         m: number of columns
         level: starting value for all cells
+        batch: number of independent replicas, or None for one grid;
+               `step`, `drop` and `run_batch` work with batches, the
+               other methods only with one grid
         """
         m = n if m is None else m
-        self.array = np.ones((n, m), dtype=np.int32) * level
+        shape = (n, m) if batch is None else (batch, n, m)
+        self.array = np.ones(shape, dtype=np.int32) * level
+        self.padded = self.marks = None
+        self.stats = None
         self.reset()
 
-    def reset(self):
+    def reset(self, record=True):
         """Start keeping track of the number of toppled cells.
+
+        record: whether to keep the number of toppled cells at each
+                time step in `toppled_seq`; for long runs, use
+                `stats` instead
         """
-        self.toppled_seq = []
+        self.toppled_seq = [] if record else None
 
     def step(self, K=3):
         """Executes one time step.
         
-        returns: number of cells that toppled
+        returns: number of cells that toppled (in each replica)
         """
         toppling = self.array > K
-        num_toppled = np.sum(toppling)
-        self.toppled_seq.append(num_toppled)
+        num_toppled = np.sum(toppling, axis=(-2, -1))
+        if self.toppled_seq is not None:
+            self.toppled_seq.append(num_toppled)
 
-        c = correlate2d(toppling, self.kernel, mode='same')
-        self.array += c
+        self.array += laplacian(toppling.astype(np.int32))
         return num_toppled
     
     def drop(self):
-        """Increments a random cell."""
+        """Increments a random cell (in each replica).
+
+        returns: index of the cell, or tuple of index arrays if batched
+        """
         a = self.array
+        if a.ndim > 2:
+            batch, n, m = a.shape
+            index = (np.arange(batch), np.random.randint(n, size=batch),
+                     np.random.randint(m, size=batch))
+            a[index] += 1
+            return index
+
         n, m = a.shape
         index = np.random.randint(n), np.random.randint(m)
         a[index] += 1
+        return index
     
     def run(self):
         """Runs until equilibrium.
@@ -62,14 +87,168 @@ class SandPile(Cell2D):
             if num_toppled == 0:
                 return i, total
 
+    def run_batch(self, K=3):
+        """Runs a batch of replicas until each one is stable.
+
+        Replicas that are stable are not stepped again, and
+        `toppled_seq` is not updated.
+
+        K: threshold for toppling
+
+        returns: tuple of (durations, totals), with one element per
+                 replica, like the results of `run`
+        """
+        a = self.array
+        batch = len(a)
+        durations = np.zeros(batch, dtype=int)
+        totals = np.zeros(batch, dtype=int)
+        active = np.arange(batch)
+
+        while len(active):
+            sub = a[active]
+            toppling = sub > K
+            num_toppled = np.sum(toppling, axis=(1, 2))
+            sub += laplacian(toppling.astype(np.int32))
+            a[active] = sub
+
+            durations[active] += 1
+            totals[active] += num_toppled
+            active = active[num_toppled > 0]
+
+        return durations, totals
+
+    def get_padded(self):
+        """Gets the array with a border of cells where grains fall off.
+
+        self.array is a view of the interior, so the two stay in sync
+        as long as self.array is modified in place.  The border cells
+        are so negative that they never topple.
+
+        returns: NumPy array
+        """
+        padded = self.padded
+        if padded is None or self.array.base is not padded:
+            padded = np.pad(self.array, 1, constant_values=self.sink)
+            self.padded = padded
+            self.array = padded[1:-1, 1:-1]
+            self.marks = np.empty(padded.size, dtype=np.intp)
+        return padded
+
+    def relax(self, index=None, K=3):
+        """Runs until equilibrium, toppling only the unstable cells.
+
+        Gives the same result as `run`, but each time step only looks
+        at the cells that toppled or got grains in the previous step.
+
+        index: location of the only cell that might be unstable, or
+               None to check the whole array
+        K: threshold for toppling
+
+        returns: duration, total number of topplings, number of
+                 distinct cells that toppled
+        """
+        padded = self.get_padded()
+        a = padded.ravel()
+        m = padded.shape[1]
+
+        if index is None:
+            frontier = np.flatnonzero(a > K)
+        else:
+            i, j = index
+            frontier = np.array([(i+1) * m + (j+1)])
+            frontier = frontier[a[frontier] > K]
+
+        offsets = [-m, -1, 1, m]
+        marks = self.marks
+        seq = self.toppled_seq
+        toppled = []
+        total = 0
+        duration = 1
+        while len(frontier):
+            num_toppled = len(frontier)
+            if seq is not None:
+                seq.append(num_toppled)
+            total += num_toppled
+            toppled.append(frontier)
+            duration += 1
+
+            a[frontier] -= 4
+            neighbors = [frontier + offset for offset in offsets]
+            for nbrs in neighbors:
+                a[nbrs] += 1
+
+            # cells that toppled can still be unstable
+            candidates = np.concatenate(neighbors + [frontier])
+            unstable = candidates[a[candidates] > K]
+
+            # remove duplicates by keeping the last occurrence of each
+            positions = np.arange(len(unstable))
+            marks[unstable] = positions
+            frontier = unstable[marks[unstable] == positions]
+
+        if seq is not None:
+            seq.append(0)
+
+        # discard the grains that fell off the edge
+        padded[[0, -1]] = self.sink
+        padded[:, [0, -1]] = self.sink
+
+        area = len(np.unique(np.concatenate(toppled))) if toppled else 0
+        return duration, total, area
+
     def drop_and_run(self):
         """Drops a random grain and runs to equilibrium.
+
+        If `stats` is an AvalancheStats object, the avalanche is
+        added to it.
         
-        returns: duration, total_toppled
+        returns: duration, total_toppled, area
         """
-        self.drop()
-        duration, total_toppled = self.run()
-        return duration, total_toppled
+        index = self.drop()
+        res = self.relax(index)
+        if self.stats is not None:
+            self.stats.add(*res)
+        return res
+
+    def relax_mass(self, guess=None, K=3):
+        """Runs until equilibrium, toppling each cell many times at once.
+
+        The final state is the same as `run`, by the abelian property,
+        but the number of time steps is much smaller.  Starting from a
+        guess of how many times each cell topples, each unstable cell
+        topples as many times as it can, which leaves a stable pile;
+        then sets of cells "untopple" while the pile stays stable.  The
+        result is the least number of topplings that makes the pile
+        stable, which is the exact answer for any guess; a better guess
+        just gets there faster.
+
+        guess: array of the number of times each cell topples, or None
+        K: threshold for toppling
+
+        returns: array of the number of times each cell toppled
+        """
+        # the border of the padded arrays collects the grains that
+        # fall off; it never topples
+        odometer = np.pad(np.zeros(self.array.shape, dtype=np.int64), 1)
+        if guess is not None:
+            odometer[1:-1, 1:-1] = guess
+        a = np.pad(self.array.astype(np.int64), 1) + laplacian(odometer)
+        inside = np.zeros(a.shape, dtype=bool)
+        inside[1:-1, 1:-1] = True
+
+        while True:
+            q = np.maximum(a - K + 3, 0) // 4
+            q[~inside] = 0
+            if not q.any():
+                break
+            odometer += q
+            a += laplacian(q)
+
+        while untopple(a, odometer, K):
+            pass
+
+        self.array[:] = a[1:-1, 1:-1]
+        return odometer[1:-1, 1:-1]
 
 
 class SandPileViewer(Cell2DViewer):
@@ -93,6 +272,271 @@ class SandPileViewer(Cell2DViewer):
             self.viewee.step()
 
 
+class AvalancheStats:
+    """Collects the duration, size and area of avalanches as they happen.
+
+    Each quantity goes into a histogram with logarithmic bins, so the
+    memory used depends on the number of bins, not the number of
+    avalanches.  Optionally, the values are also kept in NumPy arrays
+    that grow as needed.
+    """
+    names = ['duration', 'size', 'area']
+
+    def __init__(self, keep=False, bins_per_octave=4):
+        """Initializes the attributes.
+
+        keep: whether to keep every value, or only the histograms
+        bins_per_octave: number of histogram bins per factor of 2
+
+        Attributes:
+        count:  number of avalanches.
+        hists:  map from name to array of counts; bin 0 counts zeros,
+                and bin k counts values from 2**((k-1)/bins_per_octave)
+                up to (but not including) 2**(k/bins_per_octave).
+        values: map from name to array of values, if keep is True.
+        """
+        self.keep = keep
+        self.bins_per_octave = bins_per_octave
+        self.count = 0
+        self.hists = {name: np.zeros(64, dtype=np.int64)
+                      for name in self.names}
+        if keep:
+            self.values = {name: np.zeros(1024, dtype=np.int64)
+                           for name in self.names}
+
+    def add(self, duration, size, area):
+        """Adds an avalanche."""
+        for name, value in zip(self.names, (duration, size, area)):
+            k = self.get_bin(value)
+            hist = self.hists[name]
+            if k >= len(hist):
+                hist = np.pad(hist, (0, k+1 - len(hist)))
+                self.hists[name] = hist
+            hist[k] += 1
+
+            if self.keep:
+                values = self.values[name]
+                if self.count >= len(values):
+                    values = np.pad(values, (0, len(values)))
+                    self.values[name] = values
+                values[self.count] = value
+
+        self.count += 1
+
+    def get_bin(self, value):
+        """Finds the histogram bin for a value.
+
+        value: non-negative integer
+
+        returns: int
+        """
+        if value <= 0:
+            return 0
+        return int(math.floor(self.bins_per_octave * math.log2(value))) + 1
+
+    def get_values(self, name):
+        """Gets the values of one quantity, if they were kept.
+
+        name: 'duration', 'size' or 'area'
+
+        returns: NumPy array
+        """
+        return self.values[name][:self.count]
+
+    def get_hist(self, name):
+        """Gets the histogram of one quantity.
+
+        name: 'duration', 'size' or 'area'
+
+        returns: tuple of (lows, counts), where lows are the smallest
+                 values in each bin (0 for the first)
+        """
+        hist = self.hists[name]
+        last = np.max(np.nonzero(hist)[0], initial=0)
+        k = np.arange(last+1)
+        lows = np.ceil(2 ** ((k-1) / self.bins_per_octave))
+        lows[0] = 0
+        return lows, hist[:last+1]
+
+    def get_density(self, name):
+        """Gets the estimated probability density of one quantity.
+
+        Divides each count by the number of integers in the bin, which
+        is the usual way to plot log-binned power laws.  The first bin
+        (zeros) is left out.
+
+        name: 'duration', 'size' or 'area'
+
+        returns: tuple of (values, densities), where values are the
+                 geometric centers of the bins
+        """
+        lows, counts = self.get_hist(name)
+        b = self.bins_per_octave
+        k = np.arange(1, len(counts))
+        highs = np.ceil(2 ** (k / b))
+        widths = highs - lows[1:]
+        centers = 2 ** ((k - 0.5) / b)
+        valid = (widths > 0) & (counts[1:] > 0)
+        densities = counts[1:] / np.maximum(widths, 1) / self.count
+        return centers[valid], densities[valid]
+
+    def save(self, filename):
+        """Saves the statistics in a compressed .npz file.
+
+        filename: string
+        """
+        arrays = dict(count=self.count,
+                      bins_per_octave=self.bins_per_octave)
+        for name in self.names:
+            arrays['hist_' + name] = self.hists[name]
+            if self.keep:
+                arrays[name] = self.get_values(name)
+        np.savez_compressed(filename, **arrays)
+
+    @staticmethod
+    def load(filename):
+        """Reads statistics written by `save`.
+
+        filename: string
+
+        returns: AvalancheStats
+        """
+        data = np.load(filename)
+        keep = 'size' in data
+        stats = AvalancheStats(keep, int(data['bins_per_octave']))
+        stats.count = int(data['count'])
+        for name in stats.names:
+            stats.hists[name] = data['hist_' + name]
+            if keep:
+                stats.values[name] = data[name]
+        return stats
+
+
+def laplacian(a):
+    """Computes the net number of grains each cell gets when each cell
+    topples the given number of times.
+
+    a: array of the number of topplings; grains that go past the
+       edge are lost; the last two axes are the grid
+
+    returns: array
+    """
+    c = -4 * a
+    c[..., 1:, :] += a[..., :-1, :]
+    c[..., :-1, :] += a[..., 1:, :]
+    c[..., :, 1:] += a[..., :, :-1]
+    c[..., :, :-1] += a[..., :, 1:]
+    return c
+
+
+def untopple(a, odometer, K=3):
+    """Untopples a nested sequence of sets of cells, keeping the pile stable.
+
+    Untoppling a set of cells takes a grain from each cell for each
+    of its neighbors in the set and gives 4 grains to each cell in the
+    set.  Starting with every cell that toppled, this removes cells
+    that would be unstable until there are none, like Dhar's burning
+    algorithm; what is left is the largest set that can untopple.
+
+    After the set untopples, only the cells on its boundary gain
+    grains, so the next set is found by peeling from the boundary,
+    without looking at the interior again.  The pass ends when the
+    set is empty.  The cells around the set lose grains, so another
+    pass can find more.
+
+    a: padded array of grains, modified in place
+    odometer: padded array of the number of times each cell toppled,
+              modified in place; zero around the edge
+    K: threshold for toppling
+
+    returns: total number of untopplings
+    """
+    m = a.shape[1]
+    a = a.ravel()
+    odometer = odometer.ravel()
+    offsets = [-m, -1, 1, m]
+
+    in_set = odometer > 0
+    members = np.flatnonzero(in_set)
+    size = len(members)
+    degree = np.zeros(len(a), dtype=np.int64)
+    for offset in offsets:
+        degree[members] += in_set[members + offset]
+
+    # a cell leaves the set when it has untoppled as many times as
+    # it toppled
+    order = members[np.argsort(odometer[members], kind='stable')]
+    expires = odometer[order]
+
+    survived = np.zeros(len(a), dtype=np.int64)
+    marks = np.empty(len(a), dtype=np.intp)
+
+    def unique(cells):
+        # remove duplicates by keeping the last occurrence of each
+        positions = np.arange(len(cells))
+        marks[cells] = positions
+        return cells[marks[cells] == positions]
+
+    boundary = members[degree[members] < 4]
+    frontier = members[a[members] + 4 - degree[members] > K]
+    rounds = 0
+    total = 0
+    while True:
+        lo, hi = np.searchsorted(expires, [rounds, rounds+1])
+        expired = order[lo:hi]
+        frontier = unique(np.concatenate([frontier, expired[in_set[expired]]]))
+
+        # peel; only the neighbors of removed cells can become unstable
+        touched = [boundary]
+        while len(frontier):
+            in_set[frontier] = False
+            survived[frontier] = rounds
+            size -= len(frontier)
+            neighbors = [frontier + offset for offset in offsets]
+            for nbrs in neighbors:
+                degree[nbrs] -= 1
+
+            candidates = np.concatenate(neighbors)
+            candidates = candidates[in_set[candidates]]
+            touched.append(candidates)
+            index = a[candidates] + 4 - degree[candidates] > K
+            frontier = unique(candidates[index])
+
+        if size == 0:
+            break
+
+        # untopple; cells inside the set give and get 4 grains
+        boundary = np.concatenate(touched)
+        boundary = unique(boundary[in_set[boundary]])
+        a[boundary] += 4 - degree[boundary]
+        for offset in offsets:
+            nbrs = boundary + offset
+            a[nbrs[~in_set[nbrs]]] -= 1
+
+        rounds += 1
+        total += size
+        frontier = boundary[a[boundary] + 4 - degree[boundary] > K]
+
+    odometer[members] -= survived[members]
+    return total
+
+
+def poisson(f):
+    """Solves laplacian(u) = -f for u, with zeros around the edge.
+
+    Uses the discrete sine transform, which diagonalizes the Laplacian.
+
+    f: array
+
+    returns: array of float
+    """
+    n, m = f.shape
+    ci = np.cos(np.pi * np.arange(1, n+1) / (n+1))
+    cj = np.cos(np.pi * np.arange(1, m+1) / (m+1))
+    eigs = 4 - 2 * ci[:, None] - 2 * cj[None, :]
+    return dstn(dstn(f, type=1, norm='ortho') / eigs, type=1, norm='ortho')
+
+
 def single_source(pile, height=1024):
     """Adds a tower to the center cell.
     
@@ -104,6 +548,71 @@ def single_source(pile, height=1024):
     a[n//2, m//2] = height
 
 
+def extent(a):
+    """Distance from the center cell to the farthest nonzero cell,
+    measured along the rows and columns."""
+    n, m = a.shape
+    rows, cols = np.nonzero(a)
+    return max(np.max(np.abs(rows - n//2)), np.max(np.abs(cols - m//2)))
+
+
+def make_single_source(height, K=3):
+    """Makes a relaxed single source pile on an unbounded grid.
+
+    The pile with height//2 grains, scaled up by sqrt(2), is used to
+    guess the number of topplings for `relax_mass`, so the pile is
+    built by repeated doubling.  The grid starts just big enough to
+    hold the scaled pile and grows if any cell on the edge topples,
+    so no grains fall off.
+
+    The guess is too high by an amount that grows with height, and
+    `relax_mass` needs about one round of untoppling per unit of
+    error, so the time grows roughly as the square of height.  On
+    one core, 2**16 grains take under a second, 2**18 about 5 s and
+    2**20 about 50 s.
+
+    height: number of grains in the center cell
+    K: threshold for toppling
+
+    returns: SandPile
+    """
+    guess = None
+    if height < 256:
+        radius = int(np.sqrt(height)) + 1
+    else:
+        small = make_single_source(height // 2, K).array
+        r = extent(small)
+        radius = int(np.sqrt(2) * r) + 3
+
+        # sample the smaller pile at the scaled positions, adjusted
+        # so the total is right, and solve for the topplings that
+        # would turn the tower into that pile
+        m = len(small)
+        index = np.arange(-radius, radius+1) / np.sqrt(2)
+        index = np.rint(index).astype(int) + m//2
+        index = np.clip(index, 0, m-1)
+        density = small[np.ix_(index, index)].astype(float)
+        density *= height / density.sum()
+        source = -density
+        source[radius, radius] += height
+        guess = np.maximum(np.rint(poisson(source)), 0).astype(np.int64)
+
+    while True:
+        n = 2 * radius + 1
+        pile = SandPile(n, level=0)
+        pile.array[radius, radius] = height
+        odometer = pile.relax_mass(guess, K)
+
+        edges = odometer[[0, -1]].any() or odometer[:, [0, -1]].any()
+        if not edges:
+            return pile
+
+        # some grains fell off, so start again with a bigger grid
+        pad = radius // 4 + 1
+        radius += pad
+        guess = np.pad(odometer, pad)
+
+
 def main():
     n = 101
     pile = SandPile(n)
@@ -16,6 +16,7 @@ import matplotlib.pyplot as plt
     
 from time import sleep
 from IPython.display import clear_output
+from scipy.signal import correlate2d
 
 from utils import underride
 
@@ -23,24 +24,45 @@ from utils import underride
 class Cell2D:
     """Parent class for 2-D cellular automata."""
 
-    def __init__(self, n, m=None):
+    def __init__(self, n, m=None, batch=None):
         """Initializes the attributes.
 
         n: number of rows
         m: number of columns
+        batch: number of independent replicas, or None for a single grid
         """
         m = n if m is None else m
-        self.array = np.zeros((n, m), np.uint8)
+        shape = (n, m) if batch is None else (batch, n, m)
+        self.array = np.zeros(shape, np.uint8)
 
     def add_cells(self, row, col, *strings):
-        """Adds cells at the given location.
+        """Adds cells at the given location (in every replica).
 
         row: top row index
         col: left col index
         strings: list of strings of 0s and 1s
         """
         for i, s in enumerate(strings):
-            self.array[row+i, col:col+len(s)] = np.array([int(b) for b in s])
+            self.array[..., row+i, col:col+len(s)] = np.array([int(b) for b in s])
+
+    def get_replica(self, i=0):
+        """Gets the array of one replica, or the array if not batched."""
+        return self.array if self.array.ndim == 2 else self.array[i]
+
+    def step_replicas(self, index):
+        """Executes one time step for some of the replicas in a batch.
+
+        Works with any `step` that uses the last two axes of the array.
+
+        index: array of replica indices
+        """
+        full = self.array
+        self.array = full[index]
+        try:
+            self.step()
+        finally:
+            full[index] = self.array
+            self.array = full
 
     def loop(self, iters=1):
         """Runs the given number of steps."""
@@ -50,7 +72,55 @@ class Cell2D:
     def draw(self, **options):
         """Draws the array.
         """
-        draw_array(self.array, **options)
+        draw_array(self.get_replica(), **options)
+
+    def make_buffers(self, kernel=None, **options):
+        """Sets up allocation-free stepping.
+
+        Makes `stencil`, a Stencil for the array.  A step that needs a
+        second buffer for the next state can compute into the one from
+        `get_next_array` and call `swap`.
+
+        kernel: correlation kernel, defaults to self.kernel
+        options: passed to Stencil
+        """
+        kernel = self.kernel if kernel is None else kernel
+        self.stencil = Stencil(kernel, self.array.shape, **options)
+
+    def get_stencil(self, **options):
+        """Gets the Stencil for the current array.
+
+        Calls `make_buffers` the first time, and again whenever the
+        array has changed shape, as it does in `step_replicas` or in
+        a band of a BandStepper.
+
+        options: passed to make_buffers
+
+        returns: Stencil
+        """
+        stencil = getattr(self, 'stencil', None)
+        if stencil is None or stencil.shape != self.array.shape:
+            self.make_buffers(**options)
+        return self.stencil
+
+    def get_next_array(self):
+        """Gets a second buffer for the next state.
+
+        Allocates `next_array` the first time, and again whenever the
+        array has changed shape or type, so models that don't call
+        `swap` don't pay for it.
+
+        returns: NumPy array like self.array
+        """
+        next_array = getattr(self, 'next_array', None)
+        if (next_array is None or next_array.shape != self.array.shape or
+                next_array.dtype != self.array.dtype):
+            self.next_array = np.empty_like(self.array)
+        return self.next_array
+
+    def swap(self):
+        """Swaps `array` and `next_array`."""
+        self.array, self.next_array = self.next_array, self.array
 
     def animate(self, frames, interval=None, step=None):
         """Animate the automaton.
@@ -77,6 +147,169 @@ class Cell2D:
             pass
         
 
+def smallest_dtype(kernel, vmin=0, vmax=1):
+    """Chooses the smallest dtype that can hold a correlation.
+
+    kernel: array of weights
+    vmin, vmax: range of the values in the array
+
+    returns: NumPy dtype
+    """
+    kernel = np.asarray(kernel)
+    if not np.issubdtype(kernel.dtype, np.integer):
+        return np.dtype(np.float32)
+
+    low = np.minimum(kernel * vmin, kernel * vmax).sum()
+    high = np.maximum(kernel * vmin, kernel * vmax).sum()
+    low = min(low, vmin)
+    high = max(high, vmax)
+    for dtype in [np.uint8, np.int8, np.uint16, np.int16, np.int32]:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def separate(kernel):
+    """Splits a 3x3 kernel into separable and center parts.
+
+    Finds a, b, scale and center so that kernel is
+    scale * outer([1, a, 1], [1, b, 1]), plus center in the middle.
+
+    returns: tuple of (a, b, scale, center), or None if the kernel
+             is not of that form, or a, b or scale is 0
+    """
+    kernel = np.asarray(kernel, dtype=float)
+    if kernel.shape != (3, 3):
+        return None
+    corner = kernel[0, 0]
+    if corner == 0 or kernel[1, 0] == 0 or kernel[0, 1] == 0:
+        return None
+    a = kernel[1, 0] / corner
+    b = kernel[0, 1] / corner
+    center = kernel[1, 1] - corner * a * b
+    expected = corner * np.outer([1, a, 1], [1, b, 1])
+    expected[1, 1] += center
+    if not np.allclose(kernel, expected):
+        return None
+    return a, b, corner, center
+
+
+class Stencil:
+    """Computes correlations with a small kernel without allocating.
+
+    The correlation is computed as a sum of shifted slices of a
+    preallocated padded copy of the array.  It is equivalent to
+    `correlate2d(a, kernel, mode='same')` with boundary 'fill' or
+    'wrap', applied to the last two axes, so the array can have
+    leading axes for a batch of grids.
+
+    With a float dtype, a 3x3 kernel that is separable apart from the
+    center, like the one in ReactionDiffusion, is done in two passes,
+    one along each axis, which takes fewer operations.
+    """
+
+    def __init__(self, kernel, shape, dtype=None, boundary='fill',
+                 vmin=0, vmax=1):
+        """Initializes the attributes.
+
+        kernel: square array of weights with odd size
+        shape: shape of the arrays to correlate
+        dtype: dtype of the result; by default, the smallest one that
+               can hold the result for values between vmin and vmax
+        boundary: 'fill' if cells beyond the edges are 0,
+                  'wrap' if the array wraps around
+        vmin, vmax: range of the values in the array
+        """
+        self.kernel = np.asarray(kernel)
+        self.shape = tuple(shape)
+        self.boundary = boundary
+        if dtype is None:
+            dtype = smallest_dtype(self.kernel, vmin, vmax)
+        self.dtype = np.dtype(dtype)
+
+        k = len(self.kernel)
+        r = self.r = k // 2
+        n, m = self.shape[-2:]
+        self.padded = np.zeros(self.shape[:-2] + (n+2*r, m+2*r), self.dtype)
+        self.out = np.empty(self.shape, self.dtype)
+        self.temp = np.empty(self.shape, self.dtype)
+
+        # the separable parts, and a buffer for the first pass
+        self.parts = None
+        if np.issubdtype(self.dtype, np.floating):
+            self.parts = separate(self.kernel)
+        if self.parts is not None:
+            self.rows = np.empty(self.shape[:-2] + (n, m+2), self.dtype)
+
+        # one shifted slice for each nonzero weight
+        self.terms = [(self.padded[..., i:i+n, j:j+m], self.dtype.type(w))
+                      for (i, j), w in np.ndenumerate(self.kernel) if w]
+
+    def correlate(self, a, out=None):
+        """Correlates an array with the kernel.
+
+        a: array with the shape given to __init__
+        out: array where the result goes, defaults to self.out,
+             which is overwritten by the next call
+
+        returns: out
+        """
+        out = self.out if out is None else out
+        r = self.r
+        p = self.padded
+        np.copyto(p[..., r:-r, r:-r], a, casting='unsafe')
+
+        if self.boundary == 'wrap':
+            p[..., :r, r:-r] = p[..., -2*r:-r, r:-r]
+            p[..., -r:, r:-r] = p[..., r:2*r, r:-r]
+            p[..., :r] = p[..., -2*r:-r]
+            p[..., -r:] = p[..., r:2*r]
+
+        if self.parts is not None:
+            return self.correlate_separable(out)
+
+        if not self.terms:
+            out[...] = 0
+            return out
+
+        (first, w), rest = self.terms[0], self.terms[1:]
+        np.multiply(first, w, out=out, casting='unsafe')
+        for term, w in rest:
+            if w == 1:
+                np.add(out, term, out=out, casting='unsafe')
+            elif w == -1:
+                np.subtract(out, term, out=out, casting='unsafe')
+            else:
+                np.multiply(term, w, out=self.temp)
+                np.add(out, self.temp, out=out, casting='unsafe')
+        return out
+
+    def correlate_separable(self, out):
+        """Correlates the padded array using the separable parts.
+
+        (p[i-1] + p[i+1]) / a + p[i] is the pass with weights
+        [1, a, 1], divided by a, so neither pass needs a temporary.
+
+        out: array where the result goes
+
+        returns: out
+        """
+        a, b, scale, center = self.parts
+        p = self.padded
+        rows = self.rows
+        np.add(p[..., :-2, :], p[..., 2:, :], out=rows)
+        rows *= 1 / a
+        rows += p[..., 1:-1, :]
+        np.add(rows[..., :-2], rows[..., 2:], out=out)
+        out *= 1 / b
+        out += rows[..., 1:-1]
+        out *= scale * a * b
+        np.multiply(p[..., 1:-1, 1:-1], center, out=self.temp)
+        out += self.temp
+        return out
+
+
 def draw_array(array, **options):
     """Draws the cells."""
     n, m = array.shape
@@ -93,3 +326,119 @@ def draw_array(array, **options):
     plt.yticks([])
 
     return plt.imshow(array, **options)
+
+
+class ActiveTiles:
+    """Steps a 2-D automaton by recomputing only the active tiles.
+
+    The array is divided into square tiles.  A tile is active if it or
+    one of its neighbors changed during the previous step; the other
+    tiles can't change, so they are skipped.  This only works for
+    deterministic rules where each cell depends on its 3x3 neighborhood.
+
+    The new state is written into a second buffer, so tiles that are
+    skipped are already up to date from two steps ago.
+    """
+
+    def __init__(self, ca, size=64, update=None, boundary='fill'):
+        """Initializes the attributes.
+
+        ca: Cell2D object; its array is replaced by a view into
+            the buffers, so its other methods keep working
+        size: number of rows and columns in each tile
+        update: function that takes a block of cells with a
+                one-cell border and returns the next state of the
+                cells inside the border; by default it uses the
+                `kernel` and `table` attributes of ca, like Life
+        boundary: 'fill' if cells beyond the edges are 0,
+                  'wrap' if the array wraps around
+        """
+        self.ca = ca
+        self.size = size
+        self.update = self.table_update if update is None else update
+        self.boundary = boundary
+        self.reset()
+
+    def reset(self):
+        """Copies the array from ca and marks all tiles as active.
+
+        Call this after changing the array of ca directly.
+        """
+        a = self.ca.array
+        n, m = a.shape
+        self.buffers = [np.zeros((n+2, m+2), a.dtype) for i in range(2)]
+        for buffer in self.buffers:
+            buffer[1:-1, 1:-1] = a
+            self.fill_border(buffer)
+
+        s = self.size
+        self.changed = np.ones((-(-n // s), -(-m // s)), dtype=bool)
+        self.current = 0
+        self.ca.array = self.buffers[0][1:-1, 1:-1]
+
+    def fill_border(self, buffer):
+        """Copies the edges of the array into the border, if wrapping."""
+        if self.boundary == 'wrap':
+            buffer[0, 1:-1] = buffer[-2, 1:-1]
+            buffer[-1, 1:-1] = buffer[1, 1:-1]
+            buffer[:, 0] = buffer[:, -2]
+            buffer[:, -1] = buffer[:, 1]
+
+    def table_update(self, block):
+        """Computes the next state using the kernel and table of ca."""
+        c = correlate2d(block, self.ca.kernel, mode='valid')
+        return self.ca.table[c]
+
+    def active_tiles(self):
+        """Finds the tiles that changed or have a neighbor that changed.
+
+        returns: boolean array with one element per tile
+        """
+        changed = self.changed
+        if self.boundary == 'wrap':
+            active = changed.copy()
+            for di in [-1, 0, 1]:
+                for dj in [-1, 0, 1]:
+                    active |= np.roll(changed, (di, dj), axis=(0, 1))
+            return active
+
+        padded = np.pad(changed, 1)
+        tn, tm = changed.shape
+        active = np.zeros_like(changed)
+        for di in range(3):
+            for dj in range(3):
+                active |= padded[di:di+tn, dj:dj+tm]
+        return active
+
+    def step(self):
+        """Executes one time step."""
+        if self.ca.array.base is not self.buffers[self.current]:
+            self.reset()
+
+        old = self.buffers[self.current]
+        new = self.buffers[1 - self.current]
+        n, m = old.shape[0] - 2, old.shape[1] - 2
+        s = self.size
+
+        active = self.active_tiles()
+        changed = np.zeros_like(active)
+        for ti, tj in zip(*np.nonzero(active)):
+            i, j = ti * s, tj * s
+            i2, j2 = min(i + s, n), min(j + s, m)
+            block = self.update(old[i:i2+2, j:j2+2])
+            changed[ti, tj] = np.any(block != old[i+1:i2+1, j+1:j2+1])
+            new[i+1:i2+1, j+1:j2+1] = block
+
+        self.fill_border(new)
+        self.changed = changed
+        self.current = 1 - self.current
+        self.ca.array = new[1:-1, 1:-1]
+
+    def loop(self, iters=1):
+        """Runs the given number of steps."""
+        for i in range(iters):
+            self.step()
+
+    def num_active(self):
+        """Number of tiles that will be recomputed in the next step."""
+        return np.sum(self.active_tiles())
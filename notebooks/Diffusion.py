@@ -0,0 +1,354 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import multiprocessing
+
+import numpy as np
+from scipy.signal import correlate2d
+
+from Cell2D import Cell2D, Stencil, draw_array
+from utils import underride
+
+
+class Diffusion(Cell2D):
+    """Diffusion Cellular Automaton."""
+
+    kernel = np.array([[0, 1, 0],
+                       [1,-4, 1],
+                       [0, 1, 0]])
+
+    def __init__(self, n, r=0.1, boundary='fill'):
+        """Initializes the attributes.
+
+        n: number of rows
+        r: diffusion rate constant
+        boundary: 'fill' if cells beyond the edges are 0,
+                  'wrap' if the array wraps around
+        """
+        self.r = r
+        self.boundary = boundary
+        self.array = np.zeros((n, n), float)
+
+    def add_cells(self, row, col, *strings):
+        """Adds cells at the given location.
+
+        row: top row index
+        col: left col index
+        strings: list of strings of 0s and 1s
+        """
+        for i, s in enumerate(strings):
+            self.array[row+i, col:col+len(s)] = np.array([int(b) for b in s])
+
+    def step(self):
+        """Executes one time step."""
+        a = self.array
+        stencil = self.get_stencil(dtype=a.dtype, boundary=self.boundary)
+        c = stencil.correlate(a)
+        c *= self.r
+        a += c
+
+    def draw(self):
+        """Draws the cells."""
+        draw_array(self.array, cmap='Reds')
+
+
+# eigenvalues of correlation with a kernel, cached by kernel and shape
+_eigenvalues = {}
+
+
+def get_eigenvalues(kernel, shape):
+    """Computes the eigenvalues of correlation with a kernel.
+
+    With periodic boundaries, correlation is diagonal in the Fourier
+    basis, so the eigenvalues are the DFT of the kernel, wrapped
+    around so its center is at [0, 0].
+
+    kernel: 3x3 symmetric array
+    shape: shape of the grid
+
+    returns: array of eigenvalues in the layout of np.fft.rfft2
+    """
+    key = kernel.tobytes(), kernel.dtype.str, shape
+    if key not in _eigenvalues:
+        padded = np.zeros(shape)
+        for (i, j), weight in np.ndenumerate(kernel):
+            padded[(i-1) % shape[0], (j-1) % shape[1]] += weight
+        _eigenvalues[key] = np.fft.rfft2(padded).real
+    return _eigenvalues[key]
+
+
+class SpectralDiffusion(Diffusion):
+    """Diffusion with periodic boundaries, solved with the FFT.
+
+    Each step advances the array by dt time units, where a time unit
+    is one step of the explicit version, Diffusion with
+    boundary='wrap'.  The 'exact' method solves da/dt = r L a
+    exactly, where L is correlation with the kernel; 'crank-nicolson'
+    uses the trapezoid rule.  Both are stable for any dt, and both
+    converge to the explicit version when r is small.
+    """
+
+    def __init__(self, n, r=0.1, dt=1.0, method='exact'):
+        """Initializes the attributes.
+
+        n: number of rows
+        r: diffusion rate constant
+        dt: time step
+        method: 'exact' or 'crank-nicolson'
+        """
+        if method not in ('exact', 'crank-nicolson'):
+            raise ValueError('Unknown method: %s' % method)
+        Diffusion.__init__(self, n, r, boundary='wrap')
+        self.dt = dt
+        self.method = method
+
+    def get_factor(self, dt):
+        """Computes the factor each Fourier mode is multiplied by.
+
+        dt: time step
+
+        returns: array in the layout of np.fft.rfft2
+        """
+        z = self.r * dt * get_eigenvalues(self.kernel, self.array.shape)
+        if self.method == 'exact':
+            return np.exp(z)
+        return (1 + z/2) / (1 - z/2)
+
+    def step(self, dt=None):
+        """Advances by one time step.
+
+        dt: time step, defaults to self.dt
+        """
+        dt = self.dt if dt is None else dt
+        H = np.fft.rfft2(self.array)
+        H *= self.get_factor(dt)
+        self.array[:] = np.fft.irfft2(H, s=self.array.shape)
+
+    def advance(self, t):
+        """Advances by t time units in a single step."""
+        self.step(t)
+
+
+def add_island(a, height=0.1):
+    """Adds an island in the middle of the array.
+
+    height: height of the island
+    """
+    n, m = a.shape[-2:]
+    radius = min(n, m) // 20
+    i = n//2
+    j = m//2
+    a[..., i-radius:i+radius, j-radius:j+radius] += height
+
+
+class ReactionDiffusion(Diffusion):
+    """Reaction-Diffusion Cellular Automaton."""
+
+    kernel = np.array([[.05, .2, .05],
+                       [ .2, -1, .2],
+                       [.05, .2, .05]])
+
+    def __init__(self, n, params, noise=0.1, fused=False, dtype=float,
+                 batch=None):
+        """Initializes the attributes.
+
+        n: number of rows
+        params: tuple of (Da, Db, f, k); if batched, each can be an
+                array with one element per replica
+        noise: amplitude of the random initial values of array2
+        fused: if True, `step` uses `fused_step`
+        dtype: float type of the arrays, like np.float32
+        batch: number of independent replicas, or None for one grid;
+               batches always use `fused_step`
+
+        Attributes:
+        stencil: Stencil used by `fused_step`, or None.
+        """
+        shape = (n, n) if batch is None else (batch, n, n)
+        if batch is not None:
+            params = tuple(np.reshape(np.asarray(param, dtype), (-1, 1, 1))
+                           for param in params)
+            fused = True
+        self.params = params
+        self.fused = fused
+        self.array1 = np.ones(shape, dtype=dtype)
+        self.array2 = (noise * np.random.random(shape)).astype(dtype)
+        add_island(self.array2)
+        self.stencil = None
+
+    def step(self):
+        """Executes one time step."""
+        if self.fused:
+            self.fused_step()
+            return
+
+        A = self.array1
+        B = self.array2
+        ra, rb, f, k = self.params
+
+        options = dict(mode='same', boundary='wrap')
+
+        cA = correlate2d(A, self.kernel, **options)
+        cB = correlate2d(B, self.kernel, **options)
+        reaction = A * B**2
+        self.array1 += ra * cA - reaction + f * (1-A)
+        self.array2 += rb * cB + reaction - (f+k) * B
+
+    def make_fused_buffers(self):
+        """Allocates the arrays used by `fused_step`."""
+        shape = self.array1.shape
+        dtype = self.array1.dtype
+        self.stencil = Stencil(self.kernel, shape, dtype, boundary='wrap')
+        self.lap1 = np.empty(shape, dtype)
+        self.lap2 = np.empty(shape, dtype)
+        self.reaction = np.empty(shape, dtype)
+
+    def fused_step(self):
+        """Executes one time step without allocating arrays.
+
+        Computes the same update as the correlate2d version, but the
+        Laplacians are computed by a Stencil into preallocated
+        arrays, and the reaction and diffusion terms are added in
+        place.
+        """
+        if self.stencil is None or self.stencil.shape != self.array1.shape:
+            self.make_fused_buffers()
+
+        A = self.array1
+        B = self.array2
+        R = self.reaction
+        ra, rb, f, k = self.params
+
+        self.stencil.correlate(A, out=self.lap1)
+        self.stencil.correlate(B, out=self.lap2)
+
+        np.multiply(B, B, out=R)
+        R *= A
+
+        # A += ra * cA - R + f * (1-A)
+        self.lap1 *= ra
+        self.lap1 -= R
+        A *= 1 - f
+        A += self.lap1
+        A += f
+
+        # B += rb * cB + R - (f+k) * B
+        self.lap2 *= rb
+        self.lap2 += R
+        B *= 1 - f - k
+        B += self.lap2
+
+    def loop100(self):
+        self.loop(100)
+
+    def draw(self):
+        """Draws the cells (of the first replica, if batched)."""
+        options = dict(interpolation='bicubic',
+                       vmin=None, vmax=None)
+        A, B = self.array1, self.array2
+        if A.ndim > 2:
+            A, B = A[0], B[0]
+        draw_array(A, cmap='Reds', **options)
+        draw_array(B, cmap='Blues', **options)
+
+
+def make_rd(f, k, n=100, **options):
+    """Makes a ReactionDiffusion object with given parameters.
+
+    options: passed to ReactionDiffusion
+    """
+    params = 0.5, 0.25, f, k
+    rd = ReactionDiffusion(n, params, **options)
+    return rd
+
+
+def run_rd_batch(fs, ks, n, iters, thumb, seed, options):
+    """Runs a batch of ReactionDiffusion models and summarizes them.
+
+    fs, ks: arrays of parameters, one pair per replica
+    n: number of rows
+    iters: number of steps
+    thumb: number of rows in each thumbnail
+    seed: int or None
+    options: passed to ReactionDiffusion
+
+    returns: tuple of (mean, std, thumbnails), with one element per
+             replica; the statistics and thumbnails are of array2
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    params = 0.5, 0.25, fs, ks
+    rd = ReactionDiffusion(n, params, batch=len(fs), **options)
+    rd.loop(iters)
+
+    B = rd.array2
+    mean = B.mean(axis=(1, 2))
+    std = B.std(axis=(1, 2))
+
+    # average over blocks of cells
+    size = n // thumb
+    blocks = B[:, :thumb*size, :thumb*size]
+    thumbnails = blocks.reshape(-1, thumb, size, thumb, size).mean(axis=(2, 4))
+    return mean, std, thumbnails
+
+
+def sweep_rd(fs, ks, n=64, iters=4000, thumb=16, chunk=64,
+             processes=None, **options):
+    """Runs a ReactionDiffusion model for every pair of f and k.
+
+    The pairs are divided into chunks, and each chunk runs as one
+    batch, optionally in parallel.
+
+    fs, ks: sequences of parameters
+    n: number of rows
+    iters: number of steps
+    thumb: number of rows in each thumbnail
+    chunk: number of pairs in each batch
+    processes: number of worker processes, 0 to run serially,
+               or None for one per CPU
+    options: passed to ReactionDiffusion, like dtype
+
+    returns: map from 'f', 'k', 'mean', 'std' and 'thumbnails' to
+             arrays with shape (len(ks), len(fs)), or for thumbnails
+             (len(ks), len(fs), thumb, thumb)
+    """
+    F, K = np.meshgrid(fs, ks)
+    pairs_f, pairs_k = F.ravel(), K.ravel()
+    starts = range(0, len(pairs_f), chunk)
+    seeds = np.random.randint(2**31, size=len(starts)).tolist()
+    args = [(pairs_f[i:i+chunk], pairs_k[i:i+chunk], n, iters, thumb,
+             seed, options) for i, seed in zip(starts, seeds)]
+
+    if processes == 0:
+        results = [run_rd_batch(*arg) for arg in args]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(run_rd_batch, args)
+
+    mean, std, thumbnails = [np.concatenate(res) for res in zip(*results)]
+    shape = F.shape
+    return dict(f=F, k=K,
+                mean=mean.reshape(shape),
+                std=std.reshape(shape),
+                thumbnails=thumbnails.reshape(shape + (thumb, thumb)))
+
+
+def draw_sweep(summary, **options):
+    """Draws the thumbnails from sweep_rd as one image.
+
+    Rows are values of k and columns are values of f, with k
+    increasing down and f increasing to the right.
+
+    summary: map returned by sweep_rd
+    options: passed to draw_array
+    """
+    thumbnails = summary['thumbnails']
+    rows, cols, thumb, _ = thumbnails.shape
+    image = thumbnails.transpose(0, 2, 1, 3).reshape(rows*thumb, cols*thumb)
+    options = underride(options, cmap='Blues', vmin=None, vmax=None)
+    draw_array(image, **options)
@@ -0,0 +1,253 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import numpy as np
+from matplotlib.colors import LinearSegmentedColormap
+from scipy.ndimage import label
+
+from Cell2D import Cell2D, draw_array
+
+
+colors = [(0,   'white'),
+          (0.2, 'Green'),
+          (1.0, 'Orange')]
+
+cmap = LinearSegmentedColormap.from_list('mycmap', colors)
+
+
+class ForestFire(Cell2D):
+    """Forest Fire Cellular Automaton.
+
+    Cells are 0 for empty, 1 for a tree, and 5 for a fire; the grid
+    wraps around.
+    """
+
+    kernel = np.array([[0, 1, 0],
+                       [1, 0, 1],
+                       [0, 1, 0]])
+
+    def __init__(self, n, p=0.01, f=0.001, batch=None):
+        """Initializes the attributes.
+
+        n: number of rows
+        p: probability of a new tree
+        f: probability of a random fire
+        batch: number of independent replicas, or None for one grid
+
+        Attributes:
+        labels:  array of cluster ids, 0 where there is no tree.
+        sizes:   array that maps from cluster id to size.
+        labeled: boolean array of the cells that had trees when the
+                 clusters were labeled.
+        """
+        self.p = p
+        self.f = f
+
+        shape = (n, n) if batch is None else (batch, n, n)
+        self.array = np.random.choice([1, 0], shape, p=[p, 1-p])
+        self.stencil = None
+        self.labels = None
+        self.sizes = None
+        self.labeled = None
+
+    def step(self):
+        """Executes one time step."""
+        p, f = self.p, self.f
+        a = self.array
+        c = self.get_stencil(boundary='wrap', vmax=5).correlate(a)
+        r = np.random.random(a.shape)
+        new_tree = (a==0) & (r<p)
+        new_fire = (a==1) & ((c>4) | (r<f))
+        a[a==5] = 0
+        a[new_tree] = 1
+        a[new_fire] = 5
+
+    def num_trees(self, i=None):
+        """Count the number of trees (in each replica).
+
+        i: size of box to count
+        """
+        a = self.array[..., :i, :i]
+        return np.sum(a==1, axis=(-2, -1))
+
+    def num_fires(self, i=None):
+        """Count the number of fires (in each replica).
+
+        i: size of box to count
+        """
+        a = self.array[..., :i, :i]
+        return np.sum(a==5, axis=(-2, -1))
+
+    def label_clusters(self, incremental=False):
+        """Finds the clusters of trees.
+
+        Trees are connected to their four neighbors, wrapping around
+        the edges.  Cluster ids are arbitrary positive integers.
+
+        incremental: if True, and the clusters have been labeled
+                     before, only relabel the clusters that are next
+                     to cells that got or lost a tree since then
+
+        Works with one grid, not a batch.
+
+        returns: array of cluster ids, 0 where there is no tree
+        """
+        trees = self.array == 1
+        if trees.ndim != 2:
+            raise ValueError('Clusters can only be labeled in one grid')
+        if (not incremental or self.labels is None or
+                self.labels.shape != trees.shape):
+            labels, num = label_wrap(trees)
+            self.labels = labels
+            self.sizes = np.bincount(labels.ravel(), minlength=num+1)
+            self.sizes[0] = 0
+            self.labeled = trees
+            return self.labels
+
+        changed = trees != self.labeled
+        if not changed.any():
+            return self.labels
+
+        # any cluster next to a changed cell might split or merge, so
+        # relabel all of their cells
+        near = dilate_wrap(changed)
+        affected = np.zeros(len(self.sizes), dtype=bool)
+        affected[self.labels[near]] = True
+        affected[0] = False
+        region = near | affected[self.labels]
+
+        # label the bounding box of the region, unless it touches
+        # the edges, in which case clusters might wrap around
+        rows = np.flatnonzero(region.any(axis=1))
+        cols = np.flatnonzero(region.any(axis=0))
+        n, m = region.shape
+        if rows[0] > 0 and cols[0] > 0 and rows[-1] < n-1 and cols[-1] < m-1:
+            box = np.s_[rows[0]:rows[-1]+1, cols[0]:cols[-1]+1]
+            new_labels, num = label(trees[box] & region[box])
+        else:
+            box = np.s_[:, :]
+            new_labels, num = label_wrap(trees & region)
+
+        next_id = len(self.sizes)
+        self.sizes[affected] = 0
+        labels = self.labels[box]
+        labels[region[box]] = 0
+        index = new_labels > 0
+        labels[index] = new_labels[index] + (next_id - 1)
+
+        new_sizes = np.bincount(new_labels.ravel(), minlength=num+1)
+        self.sizes = np.concatenate([self.sizes, new_sizes[1:]])
+        self.labeled = trees
+
+        # renumber if the old ids take up too much space
+        if len(self.sizes) > 2 * trees.size:
+            return self.label_clusters()
+        return self.labels
+
+    def cluster_sizes(self, incremental=False):
+        """Gets the size of each cluster of trees.
+
+        incremental: passed to label_clusters
+
+        returns: array of sizes
+        """
+        self.label_clusters(incremental)
+        return self.sizes[self.sizes > 0]
+
+    def cluster_dist(self, incremental=False):
+        """Gets the distribution of cluster sizes.
+
+        incremental: passed to label_clusters
+
+        returns: tuple of (sizes, counts), where counts[i] is the number
+                 of clusters with size sizes[i]
+        """
+        return np.unique(self.cluster_sizes(incremental), return_counts=True)
+
+    def draw(self):
+        """Draws the cells (of the first replica, if batched)."""
+        draw_array(self.get_replica(), cmap=cmap, vmax=5)
+
+
+def burn_batch(fire):
+    """Runs a batch of forest fires until each one burns out.
+
+    Each replica runs until none of its cells is on fire; replicas
+    that have burned out are not stepped again.  This is meant for
+    p=0 and f=0, so a fire that goes out stays out.
+
+    fire: ForestFire object with a batch of replicas
+
+    returns: tuple of (durations, num_trees), with one element per
+             replica, where durations is the number of steps until
+             the fire went out and num_trees is the number of trees
+             left
+    """
+    batch = len(fire.array)
+    durations = np.zeros(batch, dtype=int)
+    active = np.flatnonzero(fire.num_fires())
+
+    while len(active):
+        fire.step_replicas(active)
+        durations[active] += 1
+        burning = np.any(fire.array[active] == 5, axis=(1, 2))
+        active = active[burning]
+
+    return durations, fire.num_trees()
+
+
+def dilate_wrap(a):
+    """Adds the four neighbors of each True cell, wrapping around.
+
+    a: boolean array
+
+    returns: boolean array
+    """
+    res = a.copy()
+    for axis in [0, 1]:
+        for shift in [-1, 1]:
+            res |= np.roll(a, shift, axis=axis)
+    return res
+
+
+def label_wrap(a):
+    """Labels the 4-connected clusters of True cells, wrapping around.
+
+    a: boolean array
+
+    returns: tuple of (labels, num), where labels is an array of ids
+             from 1 to num, 0 where a is False
+    """
+    labels, num = label(a)
+    if num == 0:
+        return labels, num
+
+    # pairs of ids that touch across the top/bottom and left/right edges
+    pairs = np.concatenate([
+        np.stack([labels[0], labels[-1]], axis=1),
+        np.stack([labels[:, 0], labels[:, -1]], axis=1)])
+    pairs = pairs[(pairs[:, 0] > 0) & (pairs[:, 1] > 0)]
+    if len(pairs) == 0:
+        return labels, num
+
+    parent = list(range(num+1))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in set(map(tuple, pairs)):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    roots = np.array([find(x) for x in range(num+1)])
+    unique, compact = np.unique(roots, return_inverse=True)
+    return compact[labels], len(unique) - 1
@@ -0,0 +1,392 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import weakref
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+
+from Cell2D import Cell2D, draw_array
+
+
+class Node:
+    """Represents a square block of cells in a quadtree.
+
+    A node at level k covers 2**k by 2**k cells.  Nodes are canonical:
+    there is only one node for each combination of children, so
+    identical blocks anywhere in the grid (or any generation) are the
+    same object.
+    """
+    __slots__ = ['nw', 'ne', 'sw', 'se', 'level', 'pop', 'block',
+                 '__weakref__']
+
+    def __init__(self, nw, ne, sw, se, level, pop):
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.level = level
+        self.pop = pop
+        self.block = None
+
+
+OFF = Node(None, None, None, None, 0, 0)
+ON = Node(None, None, None, None, 0, 1)
+
+# map from the ids of the children to the canonical node; a node's
+# children stay alive as long as it does, so the ids can't be reused
+canonical = weakref.WeakValueDictionary()
+
+# the empty node at each level
+empties = [OFF]
+
+# same fields as the result of functools.lru_cache().cache_info()
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def join(nw, ne, sw, se):
+    """Gets the canonical node with the given children."""
+    key = id(nw), id(ne), id(sw), id(se)
+    node = canonical.get(key)
+    if node is None:
+        pop = nw.pop + ne.pop + sw.pop + se.pop
+        node = Node(nw, ne, sw, se, nw.level+1, pop)
+        canonical[key] = node
+    return node
+
+
+def get_empty(level):
+    """Gets the empty node at the given level."""
+    while len(empties) <= level:
+        e = empties[-1]
+        empties.append(join(e, e, e, e))
+    return empties[level]
+
+
+def expand(node):
+    """Makes a node one level up with the given node in the center."""
+    e = get_empty(node.level - 1)
+    return join(join(e, e, e, node.nw),
+                join(e, e, node.ne, e),
+                join(e, node.sw, e, e),
+                join(node.se, e, e, e))
+
+
+def is_padded(node):
+    """Checks whether all live cells are in the central 1/16 of the node."""
+    return (node.nw.pop == node.nw.se.se.pop and
+            node.ne.pop == node.ne.sw.sw.pop and
+            node.sw.pop == node.sw.ne.ne.pop and
+            node.se.pop == node.se.nw.nw.pop)
+
+
+def get_block(node):
+    """Gets the cells in a node as a NumPy array.
+
+    The result is cached in the node, so this should only be used
+    for small nodes.
+    """
+    if node.block is None:
+        if node.level == 0:
+            block = np.array([[node.pop]], dtype=np.uint8)
+        else:
+            block = np.block([[get_block(node.nw), get_block(node.ne)],
+                              [get_block(node.sw), get_block(node.se)]])
+        block.flags.writeable = False
+        node.block = block
+    return node.block
+
+
+def from_array(a, level):
+    """Builds a node from the top left 2**level square of an array.
+
+    a: NumPy array, padded with zeros if it is smaller than the node
+    level: int
+
+    returns: Node
+    """
+    if not a.any():
+        return get_empty(level)
+    if level == 0:
+        return ON
+    h = 2 ** (level-1)
+    return join(from_array(a[:h, :h], level-1),
+                from_array(a[:h, h:], level-1),
+                from_array(a[h:, :h], level-1),
+                from_array(a[h:, h:], level-1))
+
+
+def life_4x4(node):
+    """Computes one generation of the center of a level 2 node.
+
+    returns: level 1 node
+    """
+    a = get_block(node)
+    center = a[1:3, 1:3]
+    counts = np.array([[np.sum(a[i:i+3, j:j+3]) for j in range(2)]
+                       for i in range(2)]) - center
+    cells = (counts == 3) | ((counts == 2) & (center == 1))
+    nw, ne, sw, se = [ON if x else OFF for x in cells.flat]
+    return join(nw, ne, sw, se)
+
+
+class HashLife(Cell2D):
+    """Implementation of Conway's Game of Life using Hashlife.
+
+    The cells live in a quadtree on an unbounded grid.  Results are
+    memoized, so repetitive patterns can be advanced by 2**k
+    generations at a time.  The dense `array` is an n by m window
+    onto the grid, which is computed when it is accessed.
+
+    Unlike `Life`, cells beyond the edges of the window are not
+    treated as dead.
+    """
+
+    def __init__(self, n, m=None, max_cache=2**20):
+        """Initializes the attributes.
+
+        n: number of rows in the window
+        m: number of columns in the window
+        max_cache: maximum number of results to keep between jumps
+
+        Attributes:
+        root:       Node that contains the live cells.
+        top, left:  grid coordinates of the top left corner of root.
+        generation: number of generations computed.
+        results:    map from (node, j) to the result of `successor`.
+        """
+        self.n = n
+        self.m = n if m is None else m
+        level = max(3, int(np.ceil(np.log2(max(self.n, self.m)))))
+        self.root = get_empty(level)
+        self.top = self.left = 0
+        self.generation = 0
+        self.max_cache = max_cache
+        self.results = {}
+        self.hits = self.misses = 0
+
+    @property
+    def array(self):
+        """The cells in the window as a NumPy array of uint8."""
+        a = np.zeros((self.n, self.m), np.uint8)
+        self.fill(a, self.root, self.top, self.left)
+        return a
+
+    @array.setter
+    def array(self, a):
+        self.n, self.m = a.shape
+        level = max(3, int(np.ceil(np.log2(max(a.shape)))))
+        size = 2 ** level
+        padded = np.zeros((size, size), np.uint8)
+        padded[:self.n, :self.m] = a
+        self.root = from_array(padded, level)
+        self.top = self.left = 0
+
+    def fill(self, a, node, top, left):
+        """Copies the live cells in a node into an array.
+
+        a: NumPy array
+        node: Node
+        top, left: coordinates of the node in the array
+        """
+        size = 2 ** node.level
+        n, m = a.shape
+        if (node.pop == 0 or top >= n or left >= m or
+                top + size <= 0 or left + size <= 0):
+            return
+
+        if node.level <= 4:
+            block = get_block(node)
+            i, j = max(top, 0), max(left, 0)
+            a[i:top+size, j:left+size] = block[i-top:n-top, j-left:m-left]
+            return
+
+        h = size // 2
+        self.fill(a, node.nw, top, left)
+        self.fill(a, node.ne, top, left+h)
+        self.fill(a, node.sw, top+h, left)
+        self.fill(a, node.se, top+h, left+h)
+
+    def get_cell(self, i, j):
+        """Gets the state of the cell at row i, column j."""
+        node, top, left = self.root, self.top, self.left
+        size = 2 ** node.level
+        if not (top <= i < top + size and left <= j < left + size):
+            return 0
+        while node.level > 0:
+            if node.pop == 0:
+                return 0
+            size //= 2
+            south, east = i >= top + size, j >= left + size
+            top += size * south
+            left += size * east
+            node = [[node.nw, node.ne], [node.sw, node.se]][south][east]
+        return node.pop
+
+    def set_cell(self, i, j, value):
+        """Sets the state of the cell at row i, column j."""
+        while True:
+            size = 2 ** self.root.level
+            if (self.top <= i < self.top + size and
+                    self.left <= j < self.left + size):
+                break
+            self.grow()
+        self.root = self.set_in(self.root, i - self.top, j - self.left, value)
+
+    def set_in(self, node, i, j, value):
+        """Makes a copy of a node with one cell changed.
+
+        i, j: coordinates of the cell relative to the node
+        """
+        if node.level == 0:
+            return ON if value else OFF
+        h = 2 ** (node.level-1)
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        if i < h and j < h:
+            nw = self.set_in(nw, i, j, value)
+        elif i < h:
+            ne = self.set_in(ne, i, j-h, value)
+        elif j < h:
+            sw = self.set_in(sw, i-h, j, value)
+        else:
+            se = self.set_in(se, i-h, j-h, value)
+        return join(nw, ne, sw, se)
+
+    def add_cells(self, row, col, *strings):
+        """Adds cells at the given location.
+
+        This works with `read_life_file` from the solutions to
+        Chapter 6, which reads a pattern from a .cells file.
+
+        row: top row index
+        col: left col index
+        strings: list of strings of 0s and 1s
+        """
+        for i, s in enumerate(strings):
+            for j, b in enumerate(s):
+                value = int(b)
+                if value or self.get_cell(row+i, col+j):
+                    self.set_cell(row+i, col+j, value)
+
+    def grow(self):
+        """Doubles the size of the root node, keeping it centered."""
+        h = 2 ** (self.root.level - 1)
+        self.root = expand(self.root)
+        self.top -= h
+        self.left -= h
+
+    def successor(self, node, j):
+        """Gets the center of a node, 2**j generations later.
+
+        Results are memoized.  Nothing is evicted during a jump, since
+        evicting results that the jump still needs makes it recompute
+        them over and over; see `trim_cache`.
+
+        node: Node with level k >= 2
+        j: int, at most k-2
+
+        returns: Node with level k-1
+        """
+        key = node, j
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            result = self.compute_successor(node, j)
+            self.results[key] = result
+        else:
+            self.hits += 1
+        return result
+
+    def trim_cache(self):
+        """Evicts the oldest results, down to max_cache of them."""
+        excess = len(self.results) - self.max_cache
+        if excess > 0:
+            for key in list(islice(self.results, excess)):
+                del self.results[key]
+
+    def compute_successor(self, node, j):
+        """Computes the center of a node, 2**j generations later.
+
+        Use `successor`, which memoizes the results.
+
+        node: Node with level k >= 2
+        j: int, at most k-2
+
+        returns: Node with level k-1
+        """
+        if node.pop == 0:
+            return node.nw
+        if node.level == 2:
+            return life_4x4(node)
+
+        successor = self.successor
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+
+        # nine overlapping subnodes, each advanced 2**j generations
+        # (or half that many if j is the maximum)
+        jj = min(j, node.level-3)
+        c1 = successor(join(nw.nw, nw.ne, nw.sw, nw.se), jj)
+        c2 = successor(join(nw.ne, ne.nw, nw.se, ne.sw), jj)
+        c3 = successor(join(ne.nw, ne.ne, ne.sw, ne.se), jj)
+        c4 = successor(join(nw.sw, nw.se, sw.nw, sw.ne), jj)
+        c5 = successor(join(nw.se, ne.sw, sw.ne, se.nw), jj)
+        c6 = successor(join(ne.sw, ne.se, se.nw, se.ne), jj)
+        c7 = successor(join(sw.nw, sw.ne, sw.sw, sw.se), jj)
+        c8 = successor(join(sw.ne, se.nw, sw.se, se.sw), jj)
+        c9 = successor(join(se.nw, se.ne, se.sw, se.se), jj)
+
+        if j < node.level - 2:
+            # the nine results are far enough along; take their centers
+            return join(join(c1.se, c2.sw, c4.ne, c5.nw),
+                        join(c2.se, c3.sw, c5.ne, c6.nw),
+                        join(c4.se, c5.sw, c7.ne, c8.nw),
+                        join(c5.se, c6.sw, c8.ne, c9.nw))
+
+        # otherwise advance another 2**(k-3) generations
+        return join(successor(join(c1, c2, c4, c5), jj),
+                    successor(join(c2, c3, c5, c6), jj),
+                    successor(join(c4, c5, c7, c8), jj),
+                    successor(join(c5, c6, c8, c9), jj))
+
+    def jump(self, k):
+        """Advances 2**k generations."""
+        # make sure the pattern can't grow past the edge of the root
+        while self.root.level < k + 2 or not is_padded(self.root):
+            self.grow()
+        self.grow()
+
+        h = 2 ** (self.root.level - 2)
+        self.root = self.successor(self.root, k)
+        self.top += h
+        self.left += h
+        self.generation += 2 ** k
+        self.trim_cache()
+
+    def step(self):
+        """Executes one time step."""
+        self.jump(0)
+
+    def loop(self, iters=1):
+        """Runs the given number of steps, 2**k at a time."""
+        k = 0
+        while iters:
+            if iters & 1:
+                self.jump(k)
+            iters >>= 1
+            k += 1
+
+    def population(self):
+        """Number of live cells on the whole grid."""
+        return self.root.pop
+
+    def cache_info(self):
+        """Hits, misses and size of the result cache."""
+        return CacheInfo(self.hits, self.misses, self.max_cache,
+                         len(self.results))
+
+    def draw(self, **options):
+        """Draws the cells in the window."""
+        draw_array(self.array, **options)
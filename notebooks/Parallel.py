@@ -0,0 +1,177 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import copy
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+# state of the current worker process, set by init_worker
+worker = {}
+
+
+def init_worker(names, shape, dtype, proto, boundary, halo, seed):
+    """Attaches a worker process to the shared arrays.
+
+    names: names of the two shared memory blocks
+    shape, dtype: shape and dtype of the arrays
+    proto: Cell2D object without an array, used to step each band
+    boundary: 'fill' or 'wrap'
+    halo: number of rows to copy from each neighboring band
+    seed: int or None
+    """
+    blocks = [SharedMemory(name=name) for name in names]
+    worker['blocks'] = blocks
+    worker['arrays'] = [np.ndarray(shape, dtype, buffer=block.buf)
+                        for block in blocks]
+    worker['proto'] = proto
+    worker['boundary'] = boundary
+    worker['halo'] = halo
+    worker['seed'] = seed
+
+
+def step_band(args):
+    """Steps one band of rows.
+
+    Reads the band and its halo rows from the current array, runs the
+    `step` method of the prototype on them, and writes the band into
+    the other array.
+
+    args: tuple of (current, band, start, stop, generation)
+    """
+    current, band, start, stop, generation = args
+    src = worker['arrays'][current]
+    dst = worker['arrays'][1-current]
+    h = worker['halo']
+    n = len(src)
+
+    if worker['boundary'] == 'wrap':
+        block = src[np.arange(start-h, stop+h) % n]
+    else:
+        block = np.zeros((stop-start+2*h,) + src.shape[1:], src.dtype)
+        lo, hi = max(start-h, 0), min(stop+h, n)
+        block[lo-start+h:hi-start+h] = src[lo:hi]
+
+    seed = worker['seed']
+    if seed is not None:
+        seq = np.random.SeedSequence([seed, generation, band])
+        np.random.seed(seq.generate_state(4))
+
+    ca = copy.copy(worker['proto'])
+    ca.array = block
+    ca.step()
+    dst[start:stop] = ca.array[h:h+stop-start]
+
+
+class BandStepper:
+    """Steps a 2-D automaton in parallel, one band of rows at a time.
+
+    The array is kept in shared memory, with a second array for the
+    next state.  Each band is stepped by a worker process, which reads
+    `halo` rows from the neighboring bands, so each generation sees
+    the previous generation everywhere.  The `step` method of the
+    automaton is used unmodified, but only the array is kept; other
+    attributes that `step` changes are discarded.
+
+    If seed is given, the random numbers used for each band in each
+    generation come from a stream determined by the seed, the
+    generation and the band, so the results depend on the number of
+    bands but not on the number of processes; processes=0 runs the
+    same computation serially.
+    """
+
+    def __init__(self, ca, processes=None, bands=None, boundary='fill',
+                 halo=1, seed=None):
+        """Initializes the attributes.
+
+        ca: Cell2D object; its array is replaced by a view into
+            shared memory until `close` is called
+        processes: number of worker processes, 0 to run serially,
+                   or None for one per CPU
+        bands: number of bands, defaults to the number of processes
+        boundary: 'fill' if cells beyond the top and bottom edges are 0,
+                  'wrap' if the array wraps around
+        halo: number of rows each band needs from its neighbors
+        seed: int or None
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if bands is None:
+            bands = max(processes, 1)
+
+        self.ca = ca
+        a = ca.array
+        self.blocks = [SharedMemory(create=True, size=max(a.nbytes, 1))
+                       for i in range(2)]
+        self.arrays = [np.ndarray(a.shape, a.dtype, buffer=block.buf)
+                       for block in self.blocks]
+        self.arrays[0][:] = a
+        self.current = 0
+        self.generation = 0
+
+        bounds = np.linspace(0, len(a), bands+1).astype(int)
+        self.bands = list(zip(bounds[:-1], bounds[1:]))
+
+        proto = copy.copy(ca)
+        proto.array = None
+        names = [block.name for block in self.blocks]
+        initargs = names, a.shape, a.dtype, proto, boundary, halo, seed
+
+        if processes:
+            methods = multiprocessing.get_all_start_methods()
+            method = 'fork' if 'fork' in methods else None
+            context = multiprocessing.get_context(method)
+            self.pool = context.Pool(processes, init_worker, initargs)
+            self.map = self.pool.map
+        else:
+            self.pool = None
+            init_worker(*initargs)
+            self.map = lambda func, seq: list(map(func, seq))
+
+        ca.array = self.arrays[self.current]
+
+    def step(self):
+        """Executes one time step."""
+        args = [(self.current, band, start, stop, self.generation)
+                for band, (start, stop) in enumerate(self.bands)]
+        self.map(step_band, args)
+        self.current = 1 - self.current
+        self.generation += 1
+        self.ca.array = self.arrays[self.current]
+
+    def loop(self, iters=1):
+        """Runs the given number of steps."""
+        for i in range(iters):
+            self.step()
+
+    def close(self):
+        """Stops the workers, frees the shared memory, and gives the
+        automaton a copy of the array."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.ca.array = self.arrays[self.current].copy()
+        self.arrays = []
+
+        # in serial mode, this process is also the worker
+        for block in worker.pop('blocks', []):
+            worker.clear()
+            block.close()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
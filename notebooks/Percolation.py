@@ -0,0 +1,351 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import multiprocessing
+from array import array
+
+import numpy as np
+from scipy.ndimage import label
+from scipy.stats import binom
+
+from Cell2D import Cell2D, draw_array
+
+
+class Percolation(Cell2D):
+    """Percolation Cellular Automaton."""
+
+    kernel = np.array([[0, 1, 0],
+                       [1, 0, 1],
+                       [0, 1, 0]])
+
+    def __init__(self, n, q=0.5, batch=None):
+        """Initializes the attributes.
+
+        n: number of rows
+        q: probability of porousness, or array of probabilities
+           with one element per replica
+        batch: number of independent replicas, or None for one grid
+        """
+        self.q = q
+        shape = (n, n) if batch is None else (batch, n, n)
+        if batch is not None:
+            q = np.reshape(q, (-1, 1, 1))
+        self.array = (np.random.random(shape) < q).astype(np.uint8)
+
+        # fill the top row with wet cells
+        self.array[..., 0, :] = 5
+        self.stencil = None
+
+    def step(self):
+        """Executes one time step."""
+        a = self.array
+        c = self.get_stencil(vmax=5).correlate(a)
+        self.array[(a==1) & (c>=5)] = 5
+
+    def num_wet(self):
+        """Total number of wet cells (in each replica)."""
+        return np.sum(self.array == 5, axis=(-2, -1))
+
+    def bottom_row_wet(self):
+        """Number of wet cells in the bottom row (of each replica)."""
+        return np.sum(self.array[..., -1, :] == 5, axis=-1)
+
+    def label_wet(self):
+        """Wets every cell connected to the top row, in one pass.
+
+        Instead of stepping until nothing changes, this labels the
+        connected clusters of porous cells and wets the cluster that
+        contains the top row.  The result is the same as running
+        `step` to a fixed point.
+
+        returns: tuple of (percolates, num_wet), with one element per
+                 replica if batched, where percolates is whether the
+                 wet cluster reaches the bottom row and num_wet is
+                 the size of the wet cluster, including the top row
+        """
+        a = self.array
+
+        # 4-connected within each grid, but not across replicas
+        structure = np.zeros((3,) * a.ndim, dtype=bool)
+        structure[(1,) * (a.ndim-2)] = self.kernel
+        structure[(1,) * a.ndim] = True
+
+        labels, _ = label(a > 0, structure)
+        top = labels[..., 0, 0]
+        wet = labels == np.reshape(top, top.shape + (1, 1))
+        a[wet] = 5
+
+        percolates = np.any(wet[..., -1, :], axis=-1)
+        num_wet = np.sum(wet, axis=(-2, -1))
+        return percolates, num_wet
+
+    def draw(self):
+        """Draws the cells."""
+        draw_array(self.get_replica(), cmap='Blues', vmax=5)
+
+
+def test_perc(perc):
+    """Run a percolation model.
+
+    Runs until water gets to the bottom row or nothing changes.
+
+    returns: boolean, whether there's a percolating cluster
+    """
+    num_wet = perc.num_wet()
+
+    while True:
+        perc.step()
+
+        if perc.bottom_row_wet():
+            return True
+
+        new_num_wet = perc.num_wet()
+        if new_num_wet == num_wet:
+            return False
+
+        num_wet = new_num_wet
+
+
+def test_perc_batch(perc):
+    """Runs a batch of percolation models.
+
+    Each replica runs until water gets to the bottom row or nothing
+    changes; replicas that are done are not stepped again.
+
+    perc: Percolation object with a batch of replicas
+
+    returns: boolean array, whether each replica percolates
+    """
+    batch = len(perc.array)
+    percolates = np.zeros(batch, dtype=bool)
+    num_wet = perc.num_wet()
+    active = np.arange(batch)
+
+    while len(active):
+        perc.step_replicas(active)
+        sub = perc.array[active]
+
+        wet = np.any(sub[:, -1] == 5, axis=1)
+        percolates[active[wet]] = True
+
+        new_num_wet = np.sum(sub == 5, axis=(1, 2))
+        stalled = new_num_wet == num_wet[active]
+        num_wet[active] = new_num_wet
+
+        active = active[~(wet | stalled)]
+
+    return percolates
+
+
+def estimate_prob_percolating(n=100, q=0.5, iters=100):
+    """Estimates the probability of percolating.
+
+    Labels all of the arrays at once as one batch.
+
+    n: int number of rows and columns
+    q: probability that a cell is permeable
+    iters: number of arrays to test
+
+    returns: float probability
+    """
+    perc = Percolation(n, q, batch=iters)
+    percolates, _ = perc.label_wet()
+    return np.mean(percolates)
+
+
+def find_critical(n=100, q=0.6, iters=100):
+    """Estimate q_crit by random walk.
+
+    returns: list of q that should wander around q_crit
+    """
+    qs = [q]
+    for i in range(iters):
+        perc = Percolation(n, q)
+        percolates, _ = perc.label_wet()
+        if percolates:
+            q -= 0.005
+        else:
+            q += 0.005
+        qs.append(q)
+    return qs
+
+
+def find_critical_batch(n=100, q=0.6, iters=100, walkers=10):
+    """Estimate q_crit by several random walks at once.
+
+    Each step of all the walks is one batch of percolation models.
+
+    returns: array of q with shape (iters+1, walkers)
+    """
+    qs = np.full(walkers, q, dtype=float)
+    res = [qs]
+    for i in range(iters):
+        perc = Percolation(n, qs, batch=walkers)
+        percolates, _ = perc.label_wet()
+        qs = qs + np.where(percolates, -0.005, 0.005)
+        res.append(qs)
+    return np.array(res)
+
+
+def run_perc_scaling(sizes, q):
+    """Counts the cells in percolating clusters for a range of sizes.
+
+    Unlike the version in Chapter 7, which stops as soon as water
+    reaches the bottom row, this counts the whole wet cluster.
+
+    sizes: sequence of int sizes
+    q: probability that a cell is permeable
+
+    returns: array of (size, size**2, num_filled) for the sizes
+             that percolate
+    """
+    res = []
+    for size in sizes:
+        perc = Percolation(size, q)
+        percolates, num_wet = perc.label_wet()
+        if percolates:
+            num_filled = num_wet - size
+            res.append((size, size**2, num_filled))
+
+    return np.transpose(res)
+
+
+def newman_ziff(n, seed=None):
+    """Fills the sites of a percolation grid one at a time.
+
+    Uses the Newman-Ziff algorithm: sites are made porous in a random
+    order and clusters are merged with union-find, so the statistics
+    for every number of porous sites come from one pass.
+
+    As in Percolation, the top row is always wet, so the sites are the
+    other n-1 rows, and a cluster spans if it touches the first and
+    last of them.  Clusters are not connected through the top row.
+
+    n: number of rows and columns
+    seed: seed for the random order
+
+    returns: tuple of (k_span, largest, mean_size), where k_span is the
+             number of porous sites when a spanning cluster first
+             appears, and largest and mean_size are arrays indexed by
+             the number of porous sites k; mean_size is the sum of
+             squared cluster sizes, excluding the largest cluster,
+             divided by k
+    """
+    rows = n - 1
+    N = rows * n
+    order = np.random.RandomState(seed).permutation(N).tolist()
+
+    parent = list(range(N))
+    size = [0] * N
+
+    # for each root, 1 if the cluster touches the top, 2 if the bottom
+    edges = [0] * N
+    for j in range(n):
+        edges[j] |= 1
+        edges[N-n+j] |= 2
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    largest = array('l', [0])
+    mean_size = array('d', [0.0])
+    big = 0
+    sumsq = 0
+    k_span = None
+
+    for k, site in enumerate(order, start=1):
+        size[site] = 1
+        sumsq += 1
+        root = site
+        j = site % n
+
+        neighbors = [site - n, site + n]
+        if j > 0:
+            neighbors.append(site - 1)
+        if j < n - 1:
+            neighbors.append(site + 1)
+
+        for other in neighbors:
+            if other < 0 or other >= N or not size[other]:
+                continue
+            r = find(other)
+            if r == root:
+                continue
+            # union by size
+            if size[r] > size[root]:
+                root, r = r, root
+            a, b = size[root], size[r]
+            sumsq += 2 * a * b
+            size[root] = a + b
+            edges[root] |= edges[r]
+            parent[r] = root
+
+        big = max(big, size[root])
+        largest.append(big)
+        mean_size.append((sumsq - big * big) / k)
+
+        if k_span is None and edges[root] == 3:
+            k_span = k
+
+    return k_span, np.array(largest), np.array(mean_size)
+
+
+def binomial_average(values, qs):
+    """Converts statistics indexed by number of sites to probabilities.
+
+    values: array indexed by number of porous sites, 0 to N
+    qs: sequence of probabilities of porousness
+
+    returns: array with one value per q
+    """
+    N = len(values) - 1
+    res = []
+    for q in qs:
+        # only the terms near the mean contribute
+        width = 10 * np.sqrt(N * q * (1-q)) + 10
+        lo = max(int(N*q - width), 0)
+        hi = min(int(N*q + width), N) + 1
+        ks = np.arange(lo, hi)
+        res.append(np.sum(binom.pmf(ks, N, q) * values[lo:hi]))
+    return np.array(res)
+
+
+def sweep_percolation(n, qs, samples=10, processes=None):
+    """Computes percolation statistics as a function of q.
+
+    Runs one Newman-Ziff pass per sample, optionally in parallel.
+
+    n: number of rows and columns
+    qs: sequence of probabilities of porousness
+    samples: number of random orders to average over
+    processes: number of worker processes, 0 to run serially,
+               or None for one per CPU
+
+    returns: map from 'spanning', 'largest' and 'mean_size' to
+             arrays with one value per q
+    """
+    seeds = np.random.randint(2**31, size=samples).tolist()
+    args = [(n, seed) for seed in seeds]
+    if processes == 0:
+        results = [newman_ziff(*arg) for arg in args]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(newman_ziff, args)
+
+    N = (n - 1) * n
+    ks = np.arange(N + 1)
+    spanning = np.mean([ks >= k_span for k_span, _, _ in results], axis=0)
+    largest = np.mean([res[1] for res in results], axis=0)
+    mean_size = np.mean([res[2] for res in results], axis=0)
+
+    return dict(spanning=binomial_average(spanning, qs),
+                largest=binomial_average(largest, qs),
+                mean_size=binomial_average(mean_size, qs))
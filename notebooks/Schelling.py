@@ -0,0 +1,188 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import numpy as np
+import seaborn as sns
+from matplotlib.colors import LinearSegmentedColormap
+
+from Cell2D import Cell2D, draw_array
+
+
+# make a custom color map
+palette = sns.color_palette('muted')
+colors = 'white', palette[1], palette[0]
+cmap = LinearSegmentedColormap.from_list('cmap', colors)
+
+
+def locs_where(condition):
+    """Find cells where a logical array is True.
+
+    condition: logical array
+
+    returns: list of location tuples
+    """
+    return list(zip(*np.nonzero(condition)))
+
+
+class Schelling(Cell2D):
+    """Represents a grid of Schelling agents."""
+
+    kernel = np.array([[1, 1, 1],
+                       [1, 0, 1],
+                       [1, 1, 1]], dtype=np.int8)
+
+    def __init__(self, n, p, vectorized=False):
+        """Initializes the attributes.
+
+        n: number of rows
+        p: threshold on the fraction of similar neighbors
+        vectorized: if True, `step` uses `batch_step`
+
+        The stencil is made when it is needed, for the current shape
+        of the array.  Since agents can move anywhere in the array,
+        a BandStepper can step this model, but agents that move into
+        or out of the halo rows of a band are lost or duplicated.
+        """
+        self.p = p
+        self.vectorized = vectorized
+        # 0 is empty, 1 is red, 2 is blue
+        choices = np.array([0, 1, 2], dtype=np.int8)
+        probs = [0.1, 0.45, 0.45]
+        self.array = np.random.choice(choices, (n, n), p=probs)
+        self.stencil = None
+
+    def count_neighbors(self):
+        """Surveys neighboring cells.
+
+        returns: tuple of
+            empty: True where cells are empty
+            frac_red: fraction of red neighbors around each cell
+            frac_blue: fraction of blue neighbors around each cell
+            frac_same: fraction of neighbors with the same color
+        """
+        a = self.array
+
+        empty = a==0
+        red = a==1
+        blue = a==2
+
+        # count red neighbors, blue neighbors, and total
+        stencil = self.get_stencil(boundary='wrap')
+        num_red = stencil.correlate(red).copy()
+        num_blue = stencil.correlate(blue)
+        num_neighbors = num_red + num_blue
+
+        # compute fraction of similar neighbors
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac_red = num_red / num_neighbors
+            frac_blue = num_blue / num_neighbors
+
+        # no neighbors is considered the same as no similar neighbors
+        # (this is an arbitrary choice for a rare event)
+        frac_red[num_neighbors == 0] = 0
+        frac_blue[num_neighbors == 0] = 0
+
+        # for each cell, compute the fraction of neighbors with the same color
+        frac_same = np.where(red, frac_red, frac_blue)
+
+        # for empty cells, frac_same is NaN
+        frac_same[empty] = np.nan
+
+        return empty, frac_red, frac_blue, frac_same
+
+    def segregation(self):
+        """Computes the average fraction of similar neighbors.
+
+        returns: fraction of similar neighbors, averaged over cells
+        """
+        _, _, _, frac_same = self.count_neighbors()
+        return np.nanmean(frac_same)
+
+    def step(self):
+        """Executes one time step.
+
+        returns: fraction of similar neighbors, averaged over cells
+        """
+        if self.vectorized:
+            return self.batch_step()
+
+        a = self.array
+        empty, _, _, frac_same = self.count_neighbors()
+
+        # find the unhappy cells (ignore NaN in frac_same)
+        with np.errstate(invalid='ignore'):
+            unhappy = frac_same < self.p
+        unhappy_locs = locs_where(unhappy)
+
+        # find the empty cells
+        empty_locs = locs_where(empty)
+
+        # shuffle the unhappy cells
+        if len(unhappy_locs):
+            np.random.shuffle(unhappy_locs)
+
+        # for each unhappy cell, choose a random destination
+        num_empty = np.sum(empty)
+
+        for source in unhappy_locs:
+            i = np.random.randint(num_empty)
+            dest = empty_locs[i]
+
+            # move
+            a[dest] = a[source]
+            a[source] = 0
+            empty_locs[i] = source
+
+        # check that the number of empty cells is unchanged
+        num_empty2 = np.sum(a==0)
+        assert num_empty == num_empty2
+
+        # return the average fraction of similar neighbors
+        return np.nanmean(frac_same)
+
+    def batch_step(self):
+        """Executes one time step, moving the agents in bulk.
+
+        The unhappy agents are shuffled and matched with shuffled empty
+        cells, and all of them move with one array assignment.  If
+        there are more unhappy agents than empty cells, the cells they
+        leave become destinations for the rest, in later rounds.
+
+        returns: fraction of similar neighbors, averaged over cells
+        """
+        a = self.array
+        empty, _, _, frac_same = self.count_neighbors()
+
+        # find the unhappy cells (ignore NaN in frac_same)
+        with np.errstate(invalid='ignore'):
+            unhappy = frac_same < self.p
+        sources = np.flatnonzero(unhappy)
+        np.random.shuffle(sources)
+        dests = np.flatnonzero(empty)
+        num_empty = len(dests)
+
+        # the indices are into the flattened array, so convert them
+        # to rows and columns, which works for any memory layout
+        while len(sources) and num_empty:
+            np.random.shuffle(dests)
+            k = min(len(sources), num_empty)
+            movers, sources = sources[:k], sources[k:]
+            source_locs = np.unravel_index(movers, a.shape)
+            a[np.unravel_index(dests[:k], a.shape)] = a[source_locs]
+            a[source_locs] = 0
+            dests = np.concatenate([dests[k:], movers])
+
+        # check that the number of empty cells is unchanged
+        assert num_empty == np.sum(a==0)
+
+        # return the average fraction of similar neighbors
+        return np.nanmean(frac_same)
+
+    def draw(self):
+        """Draws the cells."""
+        return draw_array(self.array, cmap=cmap, vmax=2)
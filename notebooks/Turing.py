@@ -0,0 +1,212 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+def compile_table(table, start='A', halt='HALT'):
+    """Compiles an action table into flat lists of integers.
+
+    table: map from (symbol, state) to (new_symbol, move, new_state),
+           where symbols are integers from 0 to 255 and move is
+           'L' or 'R'
+    start: name of the starting state
+    halt: name of the halting state
+
+    returns: tuple of (states, num_symbols, writes, moves, nexts),
+             where states is a list of state names, the index of
+             (symbol, state) in the other lists is
+             states.index(state) * num_symbols + symbol, and the
+             halting state is encoded as len(states)
+    """
+    names = set(state for symbol, state in table)
+    names.update(new_state for _, _, new_state in table.values())
+    names.discard(halt)
+    names.discard(start)
+    states = [start] + sorted(names)
+
+    symbols = set(symbol for symbol, state in table)
+    symbols.update(new_symbol for new_symbol, _, _ in table.values())
+    if min(symbols) < 0 or max(symbols) > 255:
+        raise ValueError('Symbols must be integers from 0 to 255, '
+                         'since the tape is a bytearray')
+    num_symbols = max(symbols) + 1
+
+    index = {state: i for i, state in enumerate(states)}
+    index[halt] = len(states)
+
+    # -1 in nexts marks a missing entry in the table
+    size = len(states) * num_symbols
+    writes = [0] * size
+    moves = [0] * size
+    nexts = [-1] * size
+
+    for (symbol, state), (new_symbol, move, new_state) in table.items():
+        i = index[state] * num_symbols + symbol
+        writes[i] = new_symbol
+        moves[i] = 1 if move == 'R' else -1
+        nexts[i] = index[new_state]
+
+    return states, num_symbols, writes, moves, nexts
+
+
+class FastTuring:
+    """Runs a Turing machine without keeping the whole history.
+
+    The tape is a bytearray that grows in both directions as needed,
+    and the action table is compiled into lists of integers, so each
+    step is a few list operations.  Snapshots of the tape can be saved
+    every k steps.
+    """
+
+    def __init__(self, table, start='A', halt='HALT', size=64):
+        """Initializes the machine.
+
+        table: map from (symbol, state) to (new_symbol, move, new_state)
+        start: name of the starting state
+        halt: name of the halting state
+        size: initial length of the tape
+
+        Attributes:
+        tape:      bytearray that contains the symbols.
+        origin:    index in the tape of the starting cell.
+        head:      index in the tape of the read-write head.
+        state:     index of the current state.
+        steps:     number of steps executed.
+        lo, hi:    leftmost and rightmost positions visited,
+                   relative to the starting cell.
+        snapshots: list of (steps, head, left, tape) tuples, where
+                   head and left (the position of the first cell in
+                   tape) are relative to the starting cell.
+        """
+        compiled = compile_table(table, start, halt)
+        self.states, self.num_symbols = compiled[:2]
+        self.writes, self.moves, self.nexts = compiled[2:]
+        self.halt = len(self.states)
+        self.halt_name = halt
+
+        self.tape = bytearray(size)
+        self.origin = size // 2
+        self.head = self.origin
+        self.state = 0
+        self.steps = 0
+        self.lo = self.hi = 0
+        self.snapshots = []
+
+    def grow(self):
+        """Doubles the length of the tape, adding cells on the side
+        where the head went off the end."""
+        extra = bytearray(len(self.tape))
+        if self.head < 0:
+            self.tape = extra + self.tape
+            self.origin += len(extra)
+            self.head += len(extra)
+        else:
+            self.tape += extra
+
+    def run(self, max_steps, every=None):
+        """Runs until the machine halts or max_steps have been executed.
+
+        max_steps: maximum number of steps to execute
+        every: how often to save a snapshot of the tape, or None
+
+        returns: tuple of (steps, extent, state), where extent is the
+                 number of cells visited and state is the name of the
+                 current state
+        """
+        if every and not self.snapshots:
+            self.snapshot()
+
+        end = self.steps + max_steps
+        while self.steps < end and self.state != self.halt:
+            stop = end
+            if every:
+                stop = min(end, (self.steps // every + 1) * every)
+            self.run_until(stop)
+            if every and self.steps % every == 0:
+                self.snapshot()
+
+        return self.steps, self.hi - self.lo + 1, self.get_state()
+
+    def run_until(self, stop):
+        """Executes steps until the step count reaches stop, the machine
+        halts, or the head goes off the end of the tape."""
+        tape, writes, moves = self.tape, self.writes, self.moves
+        nexts, num_symbols, halt = self.nexts, self.num_symbols, self.halt
+        head, state, steps = self.head, self.state, self.steps
+        lo, hi = self.lo + self.origin, self.hi + self.origin
+        size = len(tape)
+
+        # if the table has no action, the state stays where it
+        # stopped, so the exception leaves the machine consistent
+        try:
+            while steps < stop:
+                i = state * num_symbols + tape[head]
+                if nexts[i] < 0:
+                    raise KeyError('No action for symbol %d in state %s' %
+                                   (tape[head], self.states[state]))
+                state = nexts[i]
+                tape[head] = writes[i]
+                head += moves[i]
+                steps += 1
+
+                if head < lo:
+                    lo = head
+                    if head < 0:
+                        break
+                elif head > hi:
+                    hi = head
+                    if head >= size:
+                        break
+                if state == halt:
+                    break
+        finally:
+            self.head, self.state, self.steps = head, state, steps
+            self.lo, self.hi = lo - self.origin, hi - self.origin
+
+        if head < 0 or head >= size:
+            self.grow()
+
+    def snapshot(self):
+        """Saves a copy of the visited part of the tape."""
+        start, end = self.lo + self.origin, self.hi + self.origin + 1
+        tape = np.frombuffer(self.tape[start:end], dtype=np.uint8).copy()
+        head = self.head - self.origin
+        self.snapshots.append((self.steps, head, self.lo, tape))
+
+    def get_state(self):
+        """Gets the name of the current state."""
+        if self.state == self.halt:
+            return self.halt_name
+        return self.states[self.state]
+
+    def count_nonzero(self):
+        """Counts the nonzero symbols on the tape."""
+        return len(self.tape) - self.tape.count(0)
+
+    def get_tape(self):
+        """Gets the visited part of the tape.
+
+        returns: NumPy array of uint8
+        """
+        start, end = self.lo + self.origin, self.hi + self.origin + 1
+        return np.frombuffer(self.tape[start:end], dtype=np.uint8).copy()
+
+    def draw(self):
+        """Draws the snapshots, one per row, with the head in red."""
+        lo, hi = self.lo, self.hi
+        a = np.zeros((len(self.snapshots), hi - lo + 1), dtype=np.uint8)
+        heads = []
+        for i, (steps, head, left, tape) in enumerate(self.snapshots):
+            start = left - lo
+            a[i, start:start+len(tape)] = tape
+            heads.append(head - lo)
+
+        plt.imshow(a, cmap='Blues', alpha=0.4)
+        plt.plot(heads, np.arange(len(heads)), 'r.')
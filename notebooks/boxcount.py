@@ -0,0 +1,145 @@
+""" Code from Think Complexity, 2nd Edition, by Allen Downey.
+
+Available from http://greenteapress.com
+
+Copyright 2016 Allen B. Downey.
+MIT License: https://opensource.org/licenses/MIT
+"""
+
+import numpy as np
+from scipy.stats import linregress
+
+
+def integral_image(a):
+    """Makes a summed-area table.
+
+    table[i, j] is the sum of a[:i, :j], so the table has one more
+    row and column than a, and the sum of any box can be computed
+    from 4 elements of the table.
+
+    a: 2-D array of numbers or booleans
+
+    returns: NumPy array of int64 (or float, if a is float)
+    """
+    dtype = float if np.issubdtype(a.dtype, np.floating) else np.int64
+    n, m = a.shape
+    table = np.zeros((n+1, m+1), dtype=dtype)
+    np.cumsum(a, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def box_sums(table, top, left, height, width=None):
+    """Computes the sums of boxes using a summed-area table.
+
+    Boxes that extend past the edge of the array are clipped.
+
+    table: summed-area table from integral_image
+    top, left: coordinates of the top left corner of each box
+    height, width: dimensions of each box; width defaults to height
+
+    The arguments can be arrays, which are broadcast together.
+
+    returns: array of sums
+    """
+    width = height if width is None else width
+    n, m = table.shape
+    top = np.clip(top, 0, n-1)
+    left = np.clip(left, 0, m-1)
+    bottom = np.clip(np.add(top, height), 0, n-1)
+    right = np.clip(np.add(left, width), 0, m-1)
+    return (table[bottom, right] - table[top, right] -
+            table[bottom, left] + table[top, left])
+
+
+def count_cells(a, table=None):
+    """Counts the number of cells in boxes with increasing size.
+
+    Same as `count_cells` in Chapter 8, but each box takes constant
+    time.
+
+    a: NumPy array
+    table: summed-area table for a, if already computed
+
+    returns: array of (i, i**2, cell count) with one column per size
+    """
+    n, m = a.shape
+    if table is None:
+        table = integral_image(a)
+
+    sizes = np.arange(1, min(n, m), 2)
+    tops = (n - sizes) // 2
+    lefts = (m - sizes) // 2
+    cells = box_sums(table, tops, lefts, sizes)
+    return np.array([sizes, sizes**2, cells])
+
+
+def grid_count(a, sizes=None, table=None):
+    """Counts the boxes in a grid that contain at least one cell.
+
+    This is the usual box-counting dimension: the array is covered by
+    a grid of boxes with side s, and N(s) is the number of boxes that
+    are not empty.  Boxes on the bottom and right edges can be partial.
+
+    a: NumPy array
+    sizes: sequence of box sizes, defaults to powers of 2
+    table: summed-area table for a != 0, if already computed
+
+    returns: tuple of (sizes, counts) arrays
+    """
+    n, m = a.shape
+    if table is None:
+        table = integral_image(a != 0)
+    if sizes is None:
+        sizes = 2 ** np.arange(int(np.log2(max(n, m))) + 1)
+
+    counts = []
+    for s in sizes:
+        tops = np.arange(0, n, s)[:, None]
+        lefts = np.arange(0, m, s)[None, :]
+        counts.append(np.count_nonzero(box_sums(table, tops, lefts, s)))
+    return np.asarray(sizes), np.array(counts)
+
+
+def fit_slope(xs, ys):
+    """Fits a line to log ys versus log xs, ignoring zeros.
+
+    returns: slope
+    """
+    xs, ys = np.asarray(xs), np.asarray(ys)
+    legit = (xs > 0) & (ys > 0)
+    params = linregress(np.log(xs[legit]), np.log(ys[legit]))
+    return params[0]
+
+
+def box_count(a, method='center'):
+    """Estimates the fractal dimension of the nonzero cells.
+
+    a: NumPy array
+    method: 'center' for boxes of increasing size around the center,
+            as in Chapter 8, or 'grid' for counting boxes in a grid
+
+    returns: estimated fractal dimension
+    """
+    if method == 'center':
+        sizes, _, cells = count_cells(a != 0)
+        return fit_slope(sizes, cells)
+    elif method == 'grid':
+        sizes, counts = grid_count(a)
+        return -fit_slope(sizes, counts)
+    else:
+        raise ValueError('Unknown method: %s' % method)
+
+
+def box_count_levels(a, levels=range(4), method='center'):
+    """Estimates the fractal dimension of the cells at each level.
+
+    Makes one summed-area table per level.
+
+    a: NumPy array, like the array of a SandPile
+    levels: sequence of values to check
+    method: 'center' or 'grid', as in box_count
+
+    returns: list of estimated fractal dimensions
+    """
+    return [box_count(a == level, method) for level in levels]
@@ -6,6 +6,8 @@ Copyright 2016 Allen B. Downey.
 MIT License: https://opensource.org/licenses/MIT
 """
 
+import itertools
+
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -38,28 +40,136 @@ def print_table(table):
     print('\\end{tabular}}')
     
     
-class Cell1D:
-    """Represents a 1-D a cellular automaton"""
+def make_general_table(rule, radius=1, states=2, totalistic=False):
+    """Makes the table for a CA with any radius and number of states.
 
-    def __init__(self, rule, n, m=None):
+    rule: integer rule code, or sequence of next states
+    radius: number of neighbors on each side
+    states: number of states
+    totalistic: boolean, whether the next state depends only on
+                the sum of the neighborhood
+
+    returns: NumPy array of int8, indexed by neighborhood code
+    """
+    width = 2*radius + 1
+    size = width*(states-1) + 1 if totalistic else states**width
+
+    if not isinstance(rule, (int, np.integer)):
+        table = np.array(rule, dtype=np.int8)
+        if len(table) != size:
+            raise ValueError('Rule table should have %d entries' % size)
+        return table
+
+    # the digits of the rule in base `states`, least significant first
+    table = np.zeros(size, dtype=np.int8)
+    rule = int(rule)
+    for i in range(size):
+        rule, table[i] = divmod(rule, states)
+    return table
+
+
+class CycleDetector:
+    """Detects when a deterministic CA returns to an earlier row.
+
+    Each row is stored as a hash of its bytes, so memory use is one
+    integer per row.  Two different rows could in principle have the
+    same hash, but with 64-bit hashes that is very unlikely.
+    """
+
+    def __init__(self):
+        """Initializes the attributes.
+
+        seen:       map from row hash to the index of the row.
+        transient:  index of the first row in the cycle, or None.
+        period:     length of the cycle, or None.
+        """
+        self.seen = {}
+        self.transient = None
+        self.period = None
+
+    def add(self, key, i):
+        """Records a row.
+
+        key: bytes that identify the row
+        i: index of the row
+
+        returns: boolean, whether a cycle has been found
+        """
+        if self.period is not None:
+            return True
+
+        j = self.seen.setdefault(hash(key), i)
+        if j != i:
+            self.transient = j
+            self.period = i - j
+            return True
+        return False
+
+
+class GeneralCell1D:
+    """Represents a 1-D cellular automaton with any radius and states.
+
+    The boundary can be 'fixed' (cells beyond the edges have state
+    `fill`), 'wrap' (the row is a ring) or 'reflect' (the row is
+    mirrored at the edges).
+    """
+
+    boundaries = ['fixed', 'wrap', 'reflect']
+    detector = None
+
+    def __init__(self, rule, n, m=None, radius=1, states=2,
+                 totalistic=False, boundary='fixed', fill=0):
         """Initializes the CA.
 
-        rule: integer
+        rule: integer rule code, or sequence of next states
         n: number of rows
         m: number of columns
+        radius: number of neighbors on each side
+        states: number of states
+        totalistic: boolean, whether the rule depends only on the sum
+        boundary: string 'fixed', 'wrap' or 'reflect'
+        fill: state of the cells beyond the edges if boundary is 'fixed'
 
         Attributes:
-        table:  rule dictionary that maps from triple to next state.
+        table:  rule table that maps from neighborhood code to next state.
         array:  the numpy array that contains the data.
         next:   the index of the next empty row.
         """
-        self.table = make_table(rule)
         self.n = n
         self.m = 2*n + 1 if m is None else m
+        self.set_rule(rule, radius, states, totalistic, boundary, fill)
 
         self.array = np.zeros((n, self.m), dtype=np.int8)
         self.next = 0
 
+    def set_rule(self, rule, radius=1, states=2,
+                 totalistic=False, boundary='fixed', fill=0):
+        """Makes the rule table and the buffers used by `step`.
+
+        Arguments are the same as for __init__.
+        """
+        if boundary not in self.boundaries:
+            raise ValueError('Unknown boundary: %s' % boundary)
+        if radius > self.m:
+            raise ValueError('Radius is larger than the row')
+
+        self.radius = radius
+        self.states = states
+        self.boundary = boundary
+        self.table = make_general_table(rule, radius, states, totalistic)
+
+        # the weight of each cell in the neighborhood code
+        width = 2*radius + 1
+        if totalistic:
+            self.window = np.ones(width, dtype=np.intp)
+        else:
+            self.window = states ** np.arange(width-1, -1, -1, dtype=np.intp)
+
+        # the row with `radius` ghost cells on each side
+        self.padded = np.full(self.m + 2*radius, fill, dtype=np.int8)
+        self.codes = np.empty(self.m, dtype=np.intp)
+        self.term = np.empty(self.m, dtype=np.intp)
+
     def start_single(self):
         """Starts with one cell in the middle of the top row."""
         self.array[0, self.m//2] = 1
@@ -67,27 +177,113 @@ class Cell1D:
 
     def start_random(self):
         """Start with random values in the top row."""
-        self.array[0] = np.random.random(self.m).round()
+        self.array[0] = np.random.random(self.m) * self.states
         self.next += 1
 
     def start_string(self, s):
-        """Start with values from a string of 1s and 0s."""
+        """Start with values from a string of digits."""
         # TODO: Check string length
         self.array[0] = np.array([int(x) for x in s])
         self.next += 1
 
-    def loop(self, steps=1):
-        """Executes the given number of time steps."""
+    def loop(self, steps=1, detect=False):
+        """Executes the given number of time steps.
+
+        detect: boolean, whether to stop early if the CA enters a cycle
+
+        returns: number of steps executed
+        """
+        if not detect:
+            for i in range(steps):
+                self.step()
+            return steps
+
+        detector = self.start_detector()
         for i in range(steps):
+            if detector.period is not None:
+                return i
             self.step()
+            detector.add(self.row_key(-1), self.next-1)
+        return steps
+
+    def start_detector(self):
+        """Starts looking for cycles, beginning with the last row.
+
+        If the CA entered a cycle before detection started, the
+        transient is an overestimate.
+
+        returns: CycleDetector
+        """
+        if self.detector is None:
+            self.detector = CycleDetector()
+            self.detector.add(self.row_key(-1), self.next-1)
+        return self.detector
+
+    def get_cycle(self):
+        """Gets the cycle found by `loop`.
+
+        returns: tuple of (transient, period), or None if no cycle
+                 has been found
+        """
+        if self.detector is None or self.detector.period is None:
+            return None
+        return self.detector.transient, self.detector.period
+
+    def get_row(self, i=-1):
+        """Gets a row.
+
+        i: index of the row, negative values count back from the last row
+
+        returns: NumPy array
+        """
+        i = self.next + i if i < 0 else i
+        return self.array[i]
+
+    def row_key(self, i=-1):
+        """Gets bytes that identify a row, for cycle detection.
+
+        i: index of the row
+
+        returns: bytes
+        """
+        row = self.get_row(i)
+        if self.states == 2:
+            row = np.packbits(row)
+        return row.tobytes()
+
+    def compute_row(self, row, out):
+        """Computes the row that follows `row`.
+
+        row: NumPy array with length m
+        out: NumPy array of int8 where the result goes; it can be `row`
+        """
+        r, m = self.radius, self.m
+        p = self.padded
+        p[r:r+m] = row
+
+        # fill the ghost cells
+        if self.boundary == 'wrap':
+            p[:r] = row[m-r:]
+            p[r+m:] = row[:r]
+        elif self.boundary == 'reflect':
+            p[:r] = row[r-1::-1]
+            p[r+m:] = row[m-1:m-r-1 if m > r else None:-1]
+
+        # compute the neighborhood codes
+        c, term = self.codes, self.term
+        c[:] = 0
+        for j, w in enumerate(self.window):
+            # the padded row is int8, so multiply in intp to avoid overflow
+            np.multiply(p[j:j+m], w, out=term, dtype=np.intp)
+            c += term
+
+        np.take(self.table, c, out=out)
 
     def step(self):
         """Executes one time step by computing the next row of the array."""
         a = self.array
         i = self.next
-        window = [4, 2, 1]
-        c = np.correlate(a[i-1], window, mode='same')
-        a[i] = self.table[c]
+        self.compute_row(a[i-1], a[i])
         self.next += 1
 
     def draw(self, start=0, end=None):
@@ -102,8 +298,596 @@ class Cell1D:
         # turn off axis tick marks
         plt.xticks([])
         plt.yticks([])
-        
-        
+
+
+class Cell1D(GeneralCell1D):
+    """Represents a 1-D a cellular automaton"""
+
+    def __init__(self, rule, n, m=None):
+        """Initializes the CA.
+
+        rule: integer
+        n: number of rows
+        m: number of columns
+
+        Attributes:
+        table:  rule dictionary that maps from triple to next state.
+        array:  the numpy array that contains the data.
+        next:   the index of the next empty row.
+        """
+        GeneralCell1D.__init__(self, rule, n, m)
+
+
+class Wrap1D(GeneralCell1D):
+    """Implements a 1D cellular automaton with wrapping."""
+
+    def __init__(self, rule, n, m=None):
+        """Initializes the CA.
+
+        rule: integer
+        n: number of rows
+        m: number of columns
+        """
+        GeneralCell1D.__init__(self, rule, n, m, boundary='wrap')
+
+
+def test_general(ca, steps=10):
+    """Checks `compute_row` against a direct computation.
+
+    Steps the CA and computes each neighborhood code cell by cell,
+    using the boundary conditions, weights and table of the CA.
+
+    ca: GeneralCell1D that has been started
+    steps: number of steps to check
+
+    returns: boolean, whether every row matches
+    """
+    r, m = ca.radius, ca.m
+    fill = ca.padded[0]
+    for _ in range(steps):
+        row = ca.get_row(-1).astype(int)
+        ca.step()
+        expected = np.empty(m, dtype=np.int8)
+        for i in range(m):
+            code = 0
+            for j, w in zip(range(i-r, i+r+1), ca.window):
+                if 0 <= j < m:
+                    state = row[j]
+                elif ca.boundary == 'wrap':
+                    state = row[j % m]
+                elif ca.boundary == 'reflect':
+                    state = row[-j-1 if j < 0 else 2*m-j-1]
+                else:
+                    state = fill
+                code += int(w) * int(state)
+            expected[i] = ca.table[code]
+        if not np.array_equal(ca.get_row(-1), expected):
+            return False
+    return True
+
+
+def pack_cells(row, words):
+    """Packs a row of 0s and 1s into 64-bit words.
+
+    Cell j is stored in bit j % 64 of word j // 64.
+
+    row: sequence of 0s and 1s
+    words: number of words in the result
+
+    returns: NumPy array of uint64
+    """
+    bits = np.packbits(np.asarray(row, dtype=np.uint8), bitorder='little')
+    buf = np.zeros(words * 8, dtype=np.uint8)
+    buf[:len(bits)] = bits
+    return buf.view('<u8').astype(np.uint64)
+
+
+def unpack_cells(packed, m):
+    """Unpacks rows of 64-bit words into 0s and 1s.
+
+    packed: NumPy array of uint64, one row of words per row of cells
+    m: number of cells per row
+
+    returns: NumPy array of int8
+    """
+    packed = np.atleast_2d(packed).astype('<u8')
+    bits = np.unpackbits(packed.view(np.uint8), axis=1, bitorder='little')
+    return bits[:, :m].astype(np.int8)
+
+
+class PackedCell1D(Cell1D):
+    """Represents a 1-D cellular automaton with 64 cells per word.
+
+    The rows are stored as bits in uint64 words and each step is
+    computed with word-wide boolean operations, so memory use is
+    one bit per cell and the array is only unpacked when it is
+    accessed or drawn.
+    """
+
+    one = np.uint64(1)
+    high = np.uint64(63)
+
+    def __init__(self, rule, n, m=None):
+        """Initializes the CA.
+
+        rule: integer
+        n: number of rows
+        m: number of columns
+
+        Attributes:
+        table:   rule table that maps from triple to next state.
+        packed:  the numpy array of uint64 words that contains the data.
+        next:    the index of the next empty row.
+        """
+        self.table = make_table(rule)
+        self.n = n
+        self.m = 2*n + 1 if m is None else m
+        self.words = -(-self.m // 64)
+
+        self.packed = np.zeros((n, self.words), dtype=np.uint64)
+        self.next = 0
+
+        # clears the bits past the last column
+        extra = self.words * 64 - self.m
+        self.mask = np.uint64(2**64 - 1 >> extra)
+
+        # if most triples map to 1, it is cheaper to compute
+        # the complement and invert it
+        self.invert = np.sum(self.table) > 4
+        value = 0 if self.invert else 1
+        self.triples = np.nonzero(self.table == value)[0]
+
+        shape = 7, self.words
+        self.buffers = np.empty(shape, dtype=np.uint64)
+
+    @property
+    def array(self):
+        """Unpacks the whole CA into an array of int8."""
+        return unpack_cells(self.packed, self.m)
+
+    def get_array(self, start=0, end=None):
+        """Unpacks a range of columns.
+
+        start: index of the first column
+        end: index of the last column (exclusive)
+
+        returns: NumPy array of int8
+        """
+        end = self.m if end is None else min(end, self.m)
+        first, last = start // 64, -(-end // 64)
+        a = unpack_cells(self.packed[:, first:last], (last-first) * 64)
+        offset = first * 64
+        return a[:, start-offset:end-offset]
+
+    def row_key(self, i=-1):
+        """Gets bytes that identify a row, for cycle detection.
+
+        i: index of the row
+
+        returns: bytes
+        """
+        i = self.next + i if i < 0 else i
+        return self.packed[i].tobytes()
+
+    def set_row(self, i, row):
+        """Packs a row of cells into row i.
+
+        row: sequence of 0s and 1s with length m
+        """
+        self.packed[i] = pack_cells(row, self.words)
+
+    def start_single(self):
+        """Starts with one cell in the middle of the top row."""
+        j = self.m // 2
+        self.packed[0, j // 64] |= self.one << np.uint64(j % 64)
+        self.next += 1
+
+    def start_random(self):
+        """Start with random values in the top row."""
+        self.set_row(0, np.random.random(self.m).round())
+        self.next += 1
+
+    def start_string(self, s):
+        """Start with values from a string of 1s and 0s."""
+        self.set_row(0, [int(x) for x in s])
+        self.next += 1
+
+    def step(self):
+        """Executes one time step by computing the next row of the array."""
+        p = self.packed
+        i = self.next
+        row = p[i-1]
+        left, right, notl, notc, notr, term, out = self.buffers
+
+        # the left neighbor of cell j is in the next lower bit,
+        # which might be in the previous word
+        np.left_shift(row, self.one, out=left)
+        left[1:] |= row[:-1] >> self.high
+        np.right_shift(row, self.one, out=right)
+        right[:-1] |= row[1:] << self.high
+
+        np.invert(left, out=notl)
+        np.invert(row, out=notc)
+        np.invert(right, out=notr)
+
+        # OR together one term for each triple in the table
+        out[:] = 0
+        for triple in self.triples:
+            l = left if triple & 4 else notl
+            c = row if triple & 2 else notc
+            r = right if triple & 1 else notr
+            np.bitwise_and(l, c, out=term)
+            term &= r
+            out |= term
+
+        if self.invert:
+            np.invert(out, out=out)
+        out[-1] &= self.mask
+
+        p[i] = out
+        self.next += 1
+
+    def draw(self, start=0, end=None):
+        """Draws the CA using pyplot.imshow.
+
+        start: index of the first column to be shown
+        end: index of the last column to be shown
+        """
+        a = self.get_array(start, end)
+        plt.imshow(a, cmap='Blues', alpha=0.7)
+
+        # turn off axis tick marks
+        plt.xticks([])
+        plt.yticks([])
+
+
+class StreamCell1D(GeneralCell1D):
+    """Represents a 1-D cellular automaton that keeps only recent rows.
+
+    The last k rows are kept in a ring buffer, so memory use does not
+    depend on the number of steps.  Rows can also be written to a
+    memory-mapped .npy file as they are computed.
+    """
+
+    def __init__(self, rule, m, k=1, sink=None, n=None, **options):
+        """Initializes the CA.
+
+        rule: integer
+        m: number of columns
+        k: number of rows to keep
+        sink: optional filename of a .npy file to record rows in
+        n: number of rows in the sink, required if sink is given
+        options: passed to `set_rule`
+
+        Attributes:
+        table:   rule table that maps from triple to next state.
+        buffer:  ring buffer that contains the last k rows.
+        next:    the index of the next row.
+        sink:    memory-mapped array the rows are written to, or None.
+        """
+        self.m = m
+        self.k = k
+        self.set_rule(rule, **options)
+        self.buffer = np.zeros((k, m), dtype=np.int8)
+        self.next = 0
+        self.sink = None
+        if sink is not None:
+            self.open_sink(sink, n)
+
+    def open_sink(self, filename, n):
+        """Records rows in a memory-mapped .npy file.
+
+        Only the first n rows are recorded; after that, rows are still
+        kept in the ring buffer, but they are not written to the sink.
+
+        filename: string
+        n: maximum number of rows to record
+        """
+        if n is None:
+            raise ValueError('The number of rows in the sink, n, '
+                             'is required')
+        shape = n, self.m
+        self.sink = np.lib.format.open_memmap(filename, mode='w+',
+                                              dtype=np.int8, shape=shape)
+
+    def close_sink(self):
+        """Flushes and closes the sink."""
+        if self.sink is not None:
+            self.sink.flush()
+            self.sink = None
+
+    @property
+    def array(self):
+        """The rows in the buffer, oldest first."""
+        start = max(self.next - self.k, 0)
+        index = np.arange(start, self.next) % self.k
+        return self.buffer[index]
+
+    def get_row(self, i=-1):
+        """Gets a row from the buffer.
+
+        i: index of the row, negative values count back from the last row
+
+        returns: NumPy array, a view into the ring buffer
+        """
+        i = self.next + i if i < 0 else i
+        if not self.next - self.k <= i < self.next:
+            raise IndexError('Row %d is not in the buffer' % i)
+        return self.buffer[i % self.k]
+
+    def set_row(self, row=None):
+        """Appends a row and records it in the sink, if it is not full.
+
+        row: sequence of states, or None if the row has already
+             been written into the buffer
+        """
+        i = self.next
+        if row is not None:
+            self.buffer[i % self.k] = row
+        if self.sink is not None and i < len(self.sink):
+            self.sink[i] = self.buffer[i % self.k]
+        self.next += 1
+
+    def start_single(self):
+        """Starts with one cell in the middle of the top row."""
+        row = np.zeros(self.m, dtype=np.int8)
+        row[self.m//2] = 1
+        self.set_row(row)
+
+    def start_random(self):
+        """Start with random values in the top row."""
+        self.set_row(np.random.random(self.m) * self.states)
+
+    def start_string(self, s):
+        """Start with values from a string of digits."""
+        self.set_row(np.array([int(x) for x in s]))
+
+    def step(self):
+        """Executes one time step by computing the next row."""
+        out = self.buffer[self.next % self.k]
+        self.compute_row(self.get_row(), out)
+        self.set_row()
+
+    def rows(self, steps=None):
+        """Generates new rows.
+
+        The rows are views into the ring buffer, so they are
+        overwritten k steps later; copy them if you want to keep them.
+
+        steps: number of rows to generate, or None to run forever
+
+        yields: NumPy array of int8
+        """
+        count = itertools.count() if steps is None else range(steps)
+        for _ in count:
+            self.step()
+            yield self.get_row()
+
+
+def count_stream(ca, steps):
+    """Counts cells as the rows of a CA are generated.
+
+    This is equivalent to `count_cells` in Chapter 7, but it
+    consumes rows one at a time, so it works with StreamCell1D.
+
+    ca: a 1-D CA that has been started
+    steps: number of rows to count, including the first
+
+    returns: list of (i, i**2, cells) tuples, where cells is the
+             total number of cells in the first i rows
+    """
+    total = np.sum(ca.get_row(-1))
+    res = [(1, 1, total)]
+    for i, row in enumerate(ca.rows(steps-1), start=2):
+        total += np.sum(row)
+        res.append((i, i**2, total))
+    return res
+
+
+class RuleSweep:
+    """Runs a stack of 1-D CAs with different rules at the same time.
+
+    The current rows are stored in a (rules, m) array and each step
+    computes all of them with a single table lookup.
+    """
+
+    def __init__(self, rules=range(256), n=256, m=None, wrap=True):
+        """Initializes the sweep.
+
+        rules: sequence of integer rules
+        n: number of rows
+        m: number of columns
+        wrap: boolean, whether the rows wrap around
+
+        Attributes:
+        tables:  rule tables for all rules, concatenated.
+        array:   the current row for each rule.
+        counts:  number of cells in each row for each rule.
+        history: rows for each rule, packed into bytes.
+        next:    the index of the next row.
+        detectors: one CycleDetector per rule, or None.
+        """
+        self.rules = np.array(rules)
+        self.n = n
+        self.m = 2*n + 1 if m is None else m
+        self.wrap = wrap
+
+        num_rules = len(self.rules)
+        self.tables = np.concatenate([make_table(rule)
+                                      for rule in self.rules])
+        self.offsets = 8 * np.arange(num_rules)[:, None]
+
+        self.array = np.zeros((num_rules, self.m), dtype=np.int8)
+        self.counts = np.zeros((n, num_rules), dtype=np.int64)
+        self.history = np.zeros((n, num_rules, -(-self.m // 8)),
+                                dtype=np.uint8)
+        self.next = 0
+        self.detectors = None
+
+    def start_row(self, row):
+        """Starts all rules with the same top row."""
+        self.array[:] = row
+        self.record()
+
+    def start_single(self):
+        """Starts with one cell in the middle of the top row."""
+        row = np.zeros(self.m, dtype=np.int8)
+        row[self.m//2] = 1
+        self.start_row(row)
+
+    def start_random(self):
+        """Start with random values in the top row."""
+        self.start_row(np.random.random(self.m).round())
+
+    def start_string(self, s):
+        """Start with values from a string of 1s and 0s."""
+        self.start_row(np.array([int(x) for x in s]))
+
+    def record(self):
+        """Records statistics for the current rows."""
+        i = self.next
+        self.counts[i] = np.sum(self.array, axis=1)
+        self.history[i] = np.packbits(self.array, axis=1)
+        self.next += 1
+
+        if self.detectors is not None:
+            for detector, row in zip(self.detectors, self.history[i]):
+                detector.add(row.tobytes(), i)
+
+    def loop(self, steps=1, detect=False):
+        """Executes the given number of time steps.
+
+        detect: boolean, whether to stop early when every rule
+                has entered a cycle
+
+        returns: number of steps executed
+        """
+        if detect and self.detectors is None:
+            self.detectors = [CycleDetector() for rule in self.rules]
+            i = self.next - 1
+            for detector, row in zip(self.detectors, self.history[i]):
+                detector.add(row.tobytes(), i)
+
+        for i in range(steps):
+            if detect and self.all_cycled():
+                return i
+            self.step()
+        return steps
+
+    def all_cycled(self):
+        """Checks whether every rule has entered a cycle."""
+        if self.detectors is None:
+            return False
+        return all(d.period is not None for d in self.detectors)
+
+    def cycles(self):
+        """Gets the cycles found by `loop`.
+
+        returns: tuple of arrays (transient, period) with one value
+                 per rule, -1 where no cycle has been found
+        """
+        transient = np.full(len(self.rules), -1)
+        period = np.full(len(self.rules), -1)
+        for r, detector in enumerate(self.detectors or []):
+            if detector.period is not None:
+                transient[r] = detector.transient
+                period[r] = detector.period
+        return transient, period
+
+    def get_counts(self, n=None):
+        """Gets the number of cells in each row for each rule.
+
+        If the run stopped early because every rule entered a cycle,
+        the counts for the remaining rows are filled in from the cycles.
+
+        n: number of rows, defaults to n if every rule has cycled
+           and the number of rows computed otherwise
+
+        returns: array with shape (n, rules)
+        """
+        if n is None:
+            n = self.n if self.all_cycled() else self.next
+        if n <= self.next:
+            return self.counts[:n]
+        if not self.all_cycled():
+            raise ValueError('Only %d rows have been computed' % self.next)
+
+        transient, period = self.cycles()
+        rows = np.arange(self.next, n)[:, None]
+        index = transient + (rows - transient) % period
+        extra = self.counts[index, np.arange(len(self.rules))]
+        return np.concatenate([self.counts[:self.next], extra])
+
+    def step(self):
+        """Executes one time step for all rules."""
+        a = self.array
+        c = 2 * a
+        if self.wrap:
+            c[:, 1:] += 4 * a[:, :-1]
+            c[:, 0] += 4 * a[:, -1]
+            c[:, :-1] += a[:, 1:]
+            c[:, -1] += a[:, 0]
+        else:
+            c[:, 1:] += 4 * a[:, :-1]
+            c[:, :-1] += a[:, 1:]
+        self.array = self.tables[self.offsets + c]
+        self.record()
+
+    def density(self):
+        """Fraction of cells that are on in the last row.
+
+        returns: array with one value per rule
+        """
+        return self.get_counts()[-1] / self.m
+
+    def fractal_slope(self):
+        """Estimates the fractal dimension of each rule.
+
+        Fits a line to the log of the total number of cells
+        as a function of the log of the number of steps,
+        like `test_fractal` in Chapter 7.
+
+        returns: array with one slope per rule, NaN if a rule
+                 dies out
+        """
+        counts = self.get_counts()
+        steps = np.arange(1, len(counts))
+        cells = np.cumsum(counts[:-1], axis=0)
+        x = np.log(steps)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y = np.log(cells)
+            dx = x - x.mean()
+            slopes = dx @ (y - y.mean(axis=0)) / (dx @ dx)
+        slopes[~np.isfinite(slopes)] = np.nan
+        return slopes
+
+    def period(self):
+        """Finds the period of each rule at the end of the run.
+
+        returns: array with the number of steps since the current row
+                 last appeared for each rule, or 0 if it has not
+                 appeared before
+        """
+        if self.all_cycled():
+            return self.cycles()[1]
+
+        hist = self.history[:self.next]
+        same = np.all(hist[:-1] == hist[-1], axis=2)
+        seen = np.any(same, axis=0)
+        last = len(same) - 1 - np.argmax(same[::-1], axis=0)
+        return np.where(seen, len(same) - last, 0)
+
+    def stats(self):
+        """Computes statistics for all rules.
+
+        returns: map from statistic name to array with one value per rule
+        """
+        return dict(rule=self.rules,
+                    density=self.density(),
+                    slope=self.fractal_slope(),
+                    period=self.period())
+
+
 def draw_ca(rule, n=32):
     """Makes and draw a 1D CA with a given rule.
     